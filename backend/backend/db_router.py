@@ -0,0 +1,75 @@
+import random
+from contextlib import contextmanager
+
+from asgiref.local import Local
+from django.conf import settings
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY = 'default'
+PIN_COOKIE = 'db_primary'
+
+state = Local()
+
+
+@contextmanager
+def read_from_primary():
+    """Чтения внутри блока идут на primary.
+
+    Нужен данным, которые кэшируются под версией из кэша: собранные с
+    отстающей реплики, они остались бы устаревшими до следующей версии.
+    """
+    replica = getattr(state, 'replica', None)
+    state.replica = None
+    try:
+        yield
+    finally:
+        state.replica = replica
+
+
+class ReplicaRouter:
+    """Чтения безопасных запросов — на реплики, остальное — на primary."""
+
+    def db_for_read(self, model, **hints):
+        return getattr(state, 'replica', None) or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaMiddleware:
+    """Выбирает реплику для чтений запроса и закрепляет клиента за primary.
+
+    Реплика выбирается одна на запрос: разные реплики отстают по-разному,
+    и запросы одного ответа не должны видеть разные состояния базы.
+
+    После изменяющего запроса клиент получает cookie на
+    DATABASE_PRIMARY_PIN_SECONDS секунд и всё это время читает с primary,
+    поэтому сразу видит свои изменения, даже если реплика отстаёт.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state.replica = None
+        if (settings.DATABASE_REPLICAS
+                and request.method in SAFE_METHODS
+                and PIN_COOKIE not in request.COOKIES):
+            state.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            response = self.get_response(request)
+        finally:
+            state.replica = None
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.DATABASE_PRIMARY_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,171 @@
+import hmac
+from bisect import bisect_left
+from contextlib import ExitStack
+from threading import Lock
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+UNRESOLVED = '<unresolved>'
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus: корзины, сумма и количество."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        cumulative = 0
+        for bucket, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bucket}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+METRICS = {
+    'foodgram_request_duration_seconds': (
+        'Request latency.',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)),
+    'foodgram_db_queries': (
+        'SQL queries per request.',
+        (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)),
+    'foodgram_db_duration_seconds': (
+        'Total SQL time per request.',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)),
+    'foodgram_response_size_bytes': (
+        'Response body size.',
+        (100, 1000, 10000, 100000, 1000000, 10000000)),
+}
+
+
+class Registry:
+    """Гистограммы метрик по представлениям в памяти процесса."""
+
+    def __init__(self):
+        self.views = {}
+        self.lock = Lock()
+
+    def observe(self, view, values):
+        with self.lock:
+            histograms = self.views.get(view)
+            if histograms is None:
+                histograms = self.views[view] = {
+                    name: Histogram(buckets)
+                    for name, (_, buckets) in METRICS.items()
+                }
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (description, _) in METRICS.items():
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for view, histograms in sorted(self.views.items()):
+                    lines.extend(
+                        histograms[name].render(name, f'view="{view}"'))
+        return lines
+
+
+registry = Registry()
+
+
+class QueryCounter:
+    """execute_wrapper, считающий запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - started
+            self.count += 1
+
+
+def get_view_name(request, view_func):
+    """RecipeViewSet.list, RecipeViewSet.download_shopping_cart и т.п."""
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    method = request.method.lower()
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class MetricsMiddleware:
+    """Латентность, число и время SQL-запросов, размер ответа."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = perf_counter() - started
+        values = {
+            'foodgram_request_duration_seconds': duration,
+            'foodgram_db_queries': counter.count,
+            'foodgram_db_duration_seconds': counter.duration,
+        }
+        if not response.streaming:
+            values['foodgram_response_size_bytes'] = len(response.content)
+        registry.observe(getattr(request, 'metrics_view', UNRESOLVED), values)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'app;dur={duration * 1000:.1f}, '
+                f'db;dur={counter.duration * 1000:.1f};'
+                f'desc="{counter.count} queries"'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_name(request, view_func)
+
+
+def is_metrics_allowed(request):
+    """Метрики — сотрудникам или по заголовку Authorization: Bearer
+    METRICS_TOKEN, если токен задан.
+    """
+    if settings.METRICS_TOKEN:
+        header = request.headers.get('Authorization', '')
+        if hmac.compare_digest(
+                header.encode(), f'Bearer {settings.METRICS_TOKEN}'.encode()):
+            return True
+    return request.user.is_staff
+
+
+def metrics(request):
+    from foodgram.recipe_cache import stats
+
+    if not is_metrics_allowed(request):
+        return HttpResponseForbidden()
+    lines = registry.render()
+    for name, value in sorted(stats.items()):
+        lines.append(f'# TYPE foodgram_recipe_cache_{name}_total counter')
+        lines.append(f'foodgram_recipe_cache_{name}_total {value}')
+    return HttpResponse(
+        '\n'.join(lines) + '\n',
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
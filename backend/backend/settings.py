@@ -1,4 +1,5 @@
 import os
+from itertools import zip_longest
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -35,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "backend.metrics.MetricsMiddleware",
+    "backend.db_router.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -76,16 +79,68 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
         'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
     }
 }
 
+# Реплики: DB_REPLICA_HOSTS=host1,host2:5433 с настройками primary;
+# DB_REPLICA_NAMES=name1,name2 задаёт имена баз, например файлы SQLite.
+DATABASE_REPLICAS = []
+for number, (address, name) in enumerate(zip_longest(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(',')),
+        filter(None, os.getenv('DB_REPLICA_NAMES', default='').split(',')),
+        fillvalue=''), start=1):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': name.strip() or DATABASES['default']['NAME'],
+        'HOST': host or DATABASES['default']['HOST'],
+        'PORT': port or DATABASES['default']['PORT'],
+        'CONN_MAX_AGE': int(os.getenv(
+            'DB_REPLICA_CONN_MAX_AGE',
+            default=DATABASES['default']['CONN_MAX_AGE'])),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+DATABASE_PRIMARY_PIN_SECONDS = int(
+    os.getenv('DATABASE_PRIMARY_PIN_SECONDS', default=5))
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+    'recipes': {
+        'BACKEND': os.getenv(
+            'RECIPE_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('RECIPE_CACHE_LOCATION', default='recipes'),
+        'TIMEOUT': int(os.getenv('RECIPE_CACHE_TIMEOUT', default=300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('RECIPE_CACHE_MAX_ENTRIES', default=5000)),
+        },
+    },
+}
+
+# LocMem у каждого процесса свой: копии версий данных из базы живут в нём
+# DATA_VERSION_TIMEOUT секунд, чтобы изменения доходили до всех воркеров.
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith('.LocMemCache')
+DATA_VERSION_TIMEOUT = None if SHARED_CACHE else int(
+    os.getenv('DATA_VERSION_TIMEOUT', default=30))
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -145,4 +200,21 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+IMAGE_QUEUE_SIZE = int(os.getenv('IMAGE_QUEUE_SIZE', default=16))
+IMAGE_THUMBNAIL_SIZE = (480, 320)
+
+AUTH_TOKEN_LOCAL_SIZE = int(os.getenv('AUTH_TOKEN_LOCAL_SIZE', default=1000))
+AUTH_TOKEN_LOCAL_TTL = int(os.getenv('AUTH_TOKEN_LOCAL_TTL', default=5))
+# Из LocMem другого процесса отзыв токена не удалить: запись живёт
+# не дольше локальной.
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=300))
+if not SHARED_CACHE:
+    AUTH_TOKEN_CACHE_TIMEOUT = min(
+        AUTH_TOKEN_CACHE_TIMEOUT, AUTH_TOKEN_LOCAL_TTL)
+
 EMPTY_VALUE = '-пусто-'
+
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', default='') == '1'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
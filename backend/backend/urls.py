@@ -2,8 +2,11 @@ from django.contrib import admin
 from django.conf.urls import include
 from django.urls import path
 
+from .metrics import metrics
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/metrics/", metrics),
     path("api/", include("users.urls")),
     path("api/", include("foodgram.urls")),
 ]
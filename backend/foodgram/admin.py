@@ -2,6 +2,20 @@ from django.conf import settings
 from django.contrib import admin
 
 from . import models
+from .recipe_cache import invalidate_recipes
+from .search import refresh_search
+from users.pagination import EstimatedCountPaginator
+
+
+class RecipeIngredientsChangedMixin:
+    """Сбрасывает кэш и поисковые данные рецептов, ингредиенты
+    которых изменились в админке.
+    """
+
+    def recipes_changed(self, recipe_ids):
+        recipes = models.Recipe.objects.filter(pk__in=recipe_ids)
+        invalidate_recipes(recipes)
+        refresh_search(recipes)
 
 
 @admin.register(models.Tag)
@@ -9,6 +23,7 @@ class TagAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'color', 'slug')
     search_fields = ('name', 'color', 'slug')
     list_filter = ('name', 'color', 'slug')
+    ordering = ('name',)
     empty_value_display = settings.EMPTY_VALUE
 
 
@@ -16,38 +31,82 @@ class TagAdmin(admin.ModelAdmin):
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('pk', 'name', 'measurement_unit')
     search_fields = ('name',)
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
+    ordering = ('name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = settings.EMPTY_VALUE
 
 
 class IngredientsInLine(admin.TabularInline):
     model = models.Recipe.ingredients.through
+    autocomplete_fields = ('ingredient',)
+    extra = 1
 
 
 @admin.register(models.Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'name', 'author')
-    search_fields = ('name', 'author')
-    list_filter = ('name', 'author', 'tags')
+class RecipeAdmin(RecipeIngredientsChangedMixin, admin.ModelAdmin):
+    list_display = ('pk', 'name', 'author', 'favorites_count',
+                    'in_carts_count')
+    readonly_fields = ('favorites_count', 'in_carts_count')
+    search_fields = ('name', 'author__username', 'author__email')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    autocomplete_fields = ('author', 'tags')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = settings.EMPTY_VALUE
     inlines = [
         IngredientsInLine,
     ]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        self.recipes_changed([form.instance.pk])
+
 
 @admin.register(models.RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(RecipeIngredientsChangedMixin, admin.ModelAdmin):
     list_display = ('pk', 'recipe', 'ingredient', 'amount')
+    search_fields = ('recipe__name', 'ingredient__name')
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = settings.EMPTY_VALUE
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        recipe_ids = {obj.recipe_id}
+        if 'recipe' in form.changed_data and form.initial.get('recipe'):
+            recipe_ids.add(form.initial['recipe'])
+        self.recipes_changed(recipe_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.recipes_changed([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe', flat=True))
+        super().delete_queryset(request, queryset)
+        self.recipes_changed(recipe_ids)
+
 
 @admin.register(models.Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
-    search_fields = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(models.ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
-    search_fields = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -5,3 +5,6 @@ class FoodgramConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'foodgram'
     verbose_name = "Настройки рецептов!"
+
+    def ready(self):
+        from . import signals  # noqa: F401
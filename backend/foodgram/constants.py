@@ -6,3 +6,6 @@ DELETE_VALIDATION_ERRORS = {
     'Favorite': 'Рецепта нет в ибранном.',
     'ShoppingCart': 'Рецепта нет в списке покупок.'
 }
+SHOPPING_LIST_TITLE = 'Список покупок от Foodgram'
+SHOPPING_LIST_FILENAME = 'foodgram_shopping_list'
+SHOPPING_LIST_FORMAT_PARAM = 'file_format'
@@ -0,0 +1,25 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Recipe, ShoppingCart
+
+COUNTER_FIELDS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+def change_counter(cls, recipe_ids, delta):
+    """Атомарно меняет счётчик рецептов на delta одним UPDATE."""
+    field = COUNTER_FIELDS[cls]
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{field: F(field) + delta})
+
+
+def actual_count(cls):
+    """Подзапрос с реальным числом строк cls для рецепта."""
+    return Coalesce(Subquery(
+        cls.objects.filter(recipe=OuterRef('pk')).values('recipe').annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
@@ -1,6 +1,13 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from .models import Ingredient, Recipe, Tag
+from .models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from .search import search_recipes
+
+TRUE_VALUES = ('1', 'true', 'True')
+ORDERINGS = {
+    'popular': ('-favorites_count', '-id'),
+}
 
 
 class RecipeFilter(FilterSet):
@@ -8,27 +15,50 @@ class RecipeFilter(FilterSet):
         field_name="tags__slug",
         to_field_name="slug",
         queryset=Tag.objects.all(),
+        method="get_tags",
     )
     is_favorited = filters.CharFilter(method="get_is_favorited")
     is_in_shopping_cart = filters.CharFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(key, key) for key in ORDERINGS],
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ["author", "tags", "is_favorited", "is_in_shopping_cart"]
+        fields = ["author", "tags", "is_favorited", "is_in_shopping_cart",
+                  "search", "ordering"]
 
-    def get_is_favorited(self, queryset, name, value):
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value)))
+
+    def filter_by_user(self, queryset, value, model):
+        """Полусоединение с Favorite или ShoppingCart текущего пользователя."""
+        if value not in TRUE_VALUES:
+            return queryset
         user = self.request.user
-        if value:
-            return Recipe.objects.filter(favorite__user=user)
-        return Recipe.objects.all()
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(Exists(model.objects.filter(
+            user=user, recipe=OuterRef('pk'))))
+
+    def get_is_favorited(self, queryset, name, value):
+        return self.filter_by_user(queryset, value, Favorite)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        user = self.request.user
-        if value:
-            return Recipe.objects.filter(shopping_cart__user=user)
-        return Recipe.objects.all()
+        return self.filter_by_user(queryset, value, ShoppingCart)
+
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
 
 
 class IngredientFilter(FilterSet):
@@ -0,0 +1,73 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+from threading import BoundedSemaphore
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='recipe-images')
+queue_slots = BoundedSemaphore(settings.IMAGE_QUEUE_SIZE)
+
+
+def encode(image, image_format, **options):
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def make_variants(recipe_id):
+    """Миниатюра и WebP-версия картинки рецепта."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    with recipe.image.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source)).convert('RGB')
+    stem = PurePosixPath(recipe.image.name).stem
+    thumbnail = default_storage.save(
+        f'foodgram/thumbnails/{stem}.jpg',
+        encode(ImageOps.fit(image, settings.IMAGE_THUMBNAIL_SIZE), 'JPEG',
+               quality=85, optimize=True)
+    )
+    image_webp = default_storage.save(
+        f'foodgram/webp/{stem}.webp',
+        encode(image, 'WEBP', quality=80)
+    )
+    Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+        thumbnail=thumbnail,
+        image_webp=image_webp,
+        version=F('version') + 1,
+    )
+
+
+def run_in_worker(recipe_id):
+    try:
+        make_variants(recipe_id)
+    except Exception:
+        logger.exception('Image processing failed for recipe %s', recipe_id)
+    finally:
+        queue_slots.release()
+        connection.close()
+
+
+def schedule_variants(recipe_id):
+    """Отдаёт обработку пулу; при переполненной очереди пропускает её.
+
+    Пропущенные рецепты остаются без миниатюры, их догоняет команда
+    recipe_images.
+    """
+    if queue_slots.acquire(blocking=False):
+        executor.submit(run_in_worker, recipe_id)
+    else:
+        logger.warning(
+            'Image queue is full, variants of recipe %s skipped', recipe_id)
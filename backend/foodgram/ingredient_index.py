@@ -0,0 +1,56 @@
+import json
+from bisect import bisect_left
+from threading import Lock
+
+from backend.db_router import read_from_primary
+
+from .models import Ingredient
+from .versions import get_version
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    """Ингредиенты, отсортированные по названию, для поиска по префиксу."""
+
+    def __init__(self):
+        self._data = None
+        self._lock = Lock()
+
+    @read_from_primary()
+    def _load(self, version):
+        ingredients = sorted(
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit'),
+            key=lambda item: (item[1].lower(), item[0])
+        )
+        keys = [name.lower() for _, name, _ in ingredients]
+        items = [
+            json.dumps({
+                'id': pk,
+                'name': name,
+                'measurement_unit': measurement_unit,
+            }, ensure_ascii=False).encode()
+            for pk, name, measurement_unit in ingredients
+        ]
+        return version, keys, items
+
+    def _get_data(self):
+        version = get_version(Ingredient)
+        data = self._data
+        if data is None or data[0] != version:
+            with self._lock:
+                data = self._data
+                if data is None or data[0] != version:
+                    data = self._data = self._load(version)
+        return data
+
+    def search(self, prefix):
+        """JSON-список ингредиентов, название которых начинается с prefix."""
+        _, keys, items = self._get_data()
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + MAX_CHAR, start)
+        return b'[' + b', '.join(items[start:end]) + b']'
+
+
+ingredient_index = IngredientIndex()
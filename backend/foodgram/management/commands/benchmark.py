@@ -0,0 +1,112 @@
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from foodgram.models import Recipe, ShoppingCart, Tag
+from users.models import Follow
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = "Measure latency and queries of API endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', help='Save results as JSON.')
+        parser.add_argument('--label', default='')
+
+    def get_endpoints(self):
+        recipe = Recipe.objects.values_list('pk', 'author').first()
+        follow = Follow.objects.values_list('user', flat=True).last()
+        cart = ShoppingCart.objects.values_list('user', flat=True).last()
+        if recipe is None or follow is None:
+            raise CommandError('Run generate_data first.')
+        tag = Tag.objects.values_list('slug', flat=True).first()
+        middle_page = max(1, Recipe.objects.count() // 6 // 2)
+        return {
+            'recipes.list': ('/api/recipes/', None),
+            'recipes.list.limit50': ('/api/recipes/?limit=50', None),
+            'recipes.list.deep_page': (
+                f'/api/recipes/?page={middle_page}', None),
+            'recipes.list.cursor': ('/api/recipes/?pagination=cursor', None),
+            'recipes.list.author': (f'/api/recipes/?author={recipe[1]}', None),
+            'recipes.list.tags': (f'/api/recipes/?tags={tag}', None),
+            'recipes.list.authenticated': ('/api/recipes/', follow),
+            'recipes.list.is_favorited': (
+                '/api/recipes/?is_favorited=1', follow),
+            'recipes.retrieve': (f'/api/recipes/{recipe[0]}/', follow),
+            'ingredients.list': ('/api/ingredients/', None),
+            'ingredients.search': ('/api/ingredients/?name=мо', None),
+            'tags.list': ('/api/tags/', None),
+            'users.list': ('/api/users/', follow),
+            'users.subscriptions': ('/api/users/subscriptions/', follow),
+            'recipes.download_shopping_cart': (
+                '/api/recipes/download_shopping_cart/', cart or follow),
+        }
+
+    def get_client(self, user_id):
+        if user_id is None:
+            return Client(raise_request_exception=False)
+        token, _ = Token.objects.get_or_create(user_id=user_id)
+        return Client(
+            raise_request_exception=False,
+            HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+
+    def measure(self, client, path, count):
+        timings, queries, statuses = [], [], set()
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append(time.perf_counter() - started)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+        return {
+            'path': path,
+            'statuses': sorted(statuses),
+            'p50_ms': percentile(timings, 50) * 1000,
+            'p95_ms': percentile(timings, 95) * 1000,
+            'p99_ms': percentile(timings, 99) * 1000,
+            'mean_ms': statistics.mean(timings) * 1000,
+            'queries': statistics.mean(queries),
+            'requests_per_second': count / sum(timings),
+        }
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, (path, user_id) in self.get_endpoints().items():
+            client = self.get_client(user_id)
+            self.measure(client, path, options['warmup'])
+            result = results[name] = self.measure(
+                client, path, options['requests'])
+            self.stdout.write(
+                f'{name:35} p50 {result["p50_ms"]:8.2f}ms '
+                f'p95 {result["p95_ms"]:8.2f}ms '
+                f'p99 {result["p99_ms"]:8.2f}ms '
+                f'queries {result["queries"]:6.1f} '
+                f'rps {result["requests_per_second"]:8.1f} '
+                f'{result["statuses"]}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump({
+                    'label': options['label'],
+                    'created': datetime.now(timezone.utc).isoformat(),
+                    'requests': options['requests'],
+                    'endpoints': results,
+                }, output, ensure_ascii=False, indent=2)
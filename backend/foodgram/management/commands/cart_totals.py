@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram.models import ShoppingCartIngredient
+from foodgram.shopping_list import calculate_cart_totals
+
+
+class Command(BaseCommand):
+    help = "Rebuild or verify shopping cart ingredient totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare stored totals with the carts.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['check']:
+            return self.check_totals()
+        with transaction.atomic():
+            ShoppingCartIngredient.objects.all().delete()
+            batch = []
+            created = 0
+            for user_id, ingredient_id, amount in calculate_cart_totals():
+                batch.append(ShoppingCartIngredient(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=amount
+                ))
+                if len(batch) >= options['batch_size']:
+                    ShoppingCartIngredient.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            ShoppingCartIngredient.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(f'Rebuilt {created} totals')
+
+    def check_totals(self):
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in
+            ShoppingCartIngredient.objects.values_list(
+                'user', 'ingredient', 'amount').iterator()
+        }
+        mismatched = 0
+        for user_id, ingredient_id, amount in calculate_cart_totals():
+            if stored.pop((user_id, ingredient_id), None) != amount:
+                mismatched += 1
+        mismatched += len(stored)
+        if mismatched:
+            raise CommandError(f'{mismatched} totals are inconsistent')
+        self.stdout.write('Totals are consistent')
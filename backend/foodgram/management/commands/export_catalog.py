@@ -0,0 +1,94 @@
+import json
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import (Exists, OuterRef, Prefetch,
+                              prefetch_related_objects)
+
+from foodgram.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+User = get_user_model()
+
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+AUTHOR_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name')
+RECIPE_FIELDS = ('id', 'author_id', 'name', 'text', 'cooking_time')
+IMAGE_FIELDS = ('image', 'thumbnail', 'image_webp')
+
+
+def iter_recipes(chunk_size):
+    """Рецепты порциями по pk: prefetch работает, память не растёт."""
+    last_pk = 0
+    while True:
+        chunk = list(Recipe.objects.filter(
+            pk__gt=last_pk
+        ).order_by('pk').only(*RECIPE_FIELDS, *IMAGE_FIELDS)[:chunk_size])
+        if not chunk:
+            return
+        prefetch_related_objects(
+            chunk,
+            Prefetch('tags', queryset=Tag.objects.only('pk')),
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.only(
+                    'recipe', 'ingredient', 'amount')
+            ),
+        )
+        yield from chunk
+        last_pk = chunk[-1].pk
+
+
+class Command(BaseCommand):
+    help = "Export tags, ingredients, authors and recipes as JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File path, stdout by default.')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def write(self, output, kind, data):
+        output.write(json.dumps(
+            {'type': kind, **data}, ensure_ascii=False) + '\n')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        output = (
+            open(options['output'], 'w', encoding='utf-8')
+            if options['output'] else sys.stdout
+        )
+        started = time.perf_counter()
+        counts = dict.fromkeys(('tag', 'ingredient', 'author', 'recipe'), 0)
+        try:
+            for kind, queryset, fields in (
+                ('tag', Tag.objects, TAG_FIELDS),
+                ('ingredient', Ingredient.objects, INGREDIENT_FIELDS),
+                ('author', User.objects.filter(Exists(
+                    Recipe.objects.filter(author=OuterRef('pk'))
+                )), AUTHOR_FIELDS),
+            ):
+                for item in queryset.order_by('pk').values(
+                        *fields).iterator(chunk_size=chunk_size):
+                    self.write(output, kind, item)
+                    counts[kind] += 1
+            for recipe in iter_recipes(chunk_size):
+                data = {field: getattr(recipe, field)
+                        for field in RECIPE_FIELDS}
+                data.update({
+                    field: getattr(recipe, field).name or ''
+                    for field in IMAGE_FIELDS
+                })
+                data['tags'] = [tag.pk for tag in recipe.tags.all()]
+                data['ingredients'] = [
+                    [row.ingredient_id, row.amount]
+                    for row in recipe.recipeingredients.all()
+                ]
+                self.write(output, 'recipe', data)
+                counts['recipe'] += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(
+            ', '.join(f'{kind}s: {count}' for kind, count in counts.items())
+            + f', elapsed: {time.perf_counter() - started:.3f}s'
+        )
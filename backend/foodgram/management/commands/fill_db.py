@@ -1,19 +1,71 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
 from foodgram.models import Ingredient
+from foodgram.versions import bump_version
+
+DEFAULT_PATH = Path(__file__).resolve().parent / 'ingredients.csv'
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8') as fixture:
+        for name, measurement_unit in csv.reader(fixture):
+            yield Ingredient(name=name, measurement_unit=measurement_unit)
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as fixture:
+        for item in json.load(fixture):
+            yield Ingredient(
+                name=item['name'],
+                measurement_unit=item['measurement_unit']
+            )
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
 
 
 class Command(BaseCommand):
     help = "Load ingredients to DB"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH, type=Path,
+            help='CSV (name,measurement_unit) or JSON file.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
     def handle(self, *args, **options):
-        with open('foodgram/management/commands/ingredients.csv',
-                  encoding='utf-8') as fixture:
-            reader = csv.reader(fixture)
-            for line in reader:
-                name, measurement_unit = line
-                Ingredient.objects.get_or_create(
-                    name=name, measurement_unit=measurement_unit
-                )
+        path = options['path']
+        reader = READERS.get(path.suffix.lower())
+        if reader is None:
+            raise CommandError(f'Unsupported file format: {path.suffix}')
+        if not path.is_file():
+            raise CommandError(f'File not found: {path}')
+        started = time.perf_counter()
+        ingredients = reader(path)
+        total = 0
+        with transaction.atomic():
+            count_before = Ingredient.objects.count()
+            while True:
+                batch = list(islice(ingredients, options['batch_size']))
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+            inserted = Ingredient.objects.count() - count_before
+        if inserted:
+            bump_version(Ingredient)
+        self.stdout.write(
+            f'Inserted: {inserted}, skipped: {total - inserted}, '
+            f'elapsed: {time.perf_counter() - started:.3f}s'
+        )
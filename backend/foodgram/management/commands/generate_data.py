@@ -0,0 +1,147 @@
+import random
+import time
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from foodgram.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                             ShoppingCart, Tag)
+from foodgram.versions import bump_version
+from users.models import Follow
+
+User = get_user_model()
+
+TAGS = (
+    ('Завтрак', Tag.YELLOW, 'breakfast'),
+    ('Обед', Tag.GREEN, 'lunch'),
+    ('Ужин', Tag.BLUE, 'dinner'),
+    ('Десерт', Tag.RED, 'dessert'),
+)
+WORDS = (
+    'суп', 'салат', 'пирог', 'рагу', 'каша', 'запеканка', 'паста', 'омлет',
+    'домашний', 'быстрый', 'острый', 'сладкий', 'овощной', 'куриный',
+)
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic dataset with bulk inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--favorites-per-user', type=int, default=30)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(
+            objects, batch_size=self.batch_size, ignore_conflicts=True)
+        self.stdout.write(f'{model.__name__}: {len(objects)}')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        rng = random.Random(options['seed'])
+        # С --seed повторный запуск даёт те же данные, включая имена.
+        prefix = 'gen-' + (
+            uuid4().hex[:8] if options['seed'] is None
+            else f'{rng.getrandbits(32):08x}'
+        )
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(
+                f'Data with prefix {prefix} already exists, '
+                'use another --seed.')
+        started = time.perf_counter()
+        if not Ingredient.objects.exists():
+            call_command('fill_db', stdout=self.stdout)
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in TAGS
+            )
+            bump_version(Tag)
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        with transaction.atomic():
+            user_ids = self.create_users(prefix, options['users'])
+            recipe_ids = self.create_recipes(
+                rng, prefix, options['recipes'], user_ids)
+            self.bulk_create(Recipe.tags.through, [
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in rng.sample(
+                    tag_ids, rng.randint(1, len(tag_ids)))
+            ])
+            per_recipe = min(
+                options['ingredients_per_recipe'], len(ingredient_ids))
+            self.bulk_create(RecipeIngredient, [
+                RecipeIngredient(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500)
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in rng.sample(
+                    ingredient_ids, rng.randint(1, per_recipe))
+            ])
+            self.bulk_create(Follow, [
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id in user_ids
+                for author_id in rng.sample(
+                    user_ids, min(options['follows_per_user'], len(user_ids)))
+                if author_id != user_id
+            ])
+            for model, count in ((Favorite, options['favorites_per_user']),
+                                 (ShoppingCart, options['cart_per_user'])):
+                self.bulk_create(model, [
+                    model(user_id=user_id, recipe_id=recipe_id)
+                    for user_id in user_ids
+                    for recipe_id in rng.sample(
+                        recipe_ids, min(count, len(recipe_ids)))
+                ])
+            call_command('cart_totals', stdout=self.stdout)
+            call_command('recipe_counters', stdout=self.stdout)
+            call_command('refresh_search', stdout=self.stdout)
+        self.stdout.write(
+            f'Done in {time.perf_counter() - started:.1f}s, prefix {prefix}')
+
+    def bulk_insert(self, model, objects):
+        """pk вставленных строк: bulk_create на SQLite их не возвращает,
+        поэтому берутся pk больше прежнего максимума.
+        """
+        last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        self.bulk_create(model, objects)
+        return list(model.objects.filter(
+            pk__gt=last_pk).values_list('pk', flat=True))
+
+    def create_users(self, prefix, count):
+        password = make_password(prefix)
+        return self.bulk_insert(User, [
+            User(
+                username=f'{prefix}-{number}',
+                email=f'{prefix}-{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(count)
+        ])
+
+    def create_recipes(self, rng, prefix, count, user_ids):
+        if not user_ids:
+            return []
+        return self.bulk_insert(Recipe, [
+            Recipe(
+                author_id=rng.choice(user_ids),
+                name=f'{prefix}-{number} ' + ' '.join(rng.sample(WORDS, 2)),
+                text=' '.join(rng.choices(WORDS, k=40)),
+                cooking_time=rng.randint(5, 180),
+            )
+            for number in range(count)
+        ])
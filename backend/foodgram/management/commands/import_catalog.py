@@ -0,0 +1,161 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from foodgram.models import Ingredient, Recipe, RecipeIngredient, Tag
+from foodgram.search import refresh_search
+from foodgram.versions import bump_version
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Import a JSON Lines catalog written by export_catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File path or - for stdin.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def import_tags(self, items):
+        slugs = {item['slug'] for item in items}
+        existing = dict(
+            Tag.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+        Tag.objects.bulk_create([
+            Tag(name=item['name'], color=item['color'], slug=item['slug'])
+            for item in items if item['slug'] not in existing
+        ])
+        self.created['tag'] += len(slugs - existing.keys())
+        existing = dict(
+            Tag.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+        for item in items:
+            self.tags[item['id']] = existing[item['slug']]
+
+    def import_ingredients(self, items):
+        count_before = Ingredient.objects.count()
+        Ingredient.objects.bulk_create([
+            Ingredient(
+                name=item['name'], measurement_unit=item['measurement_unit'])
+            for item in items
+        ], ignore_conflicts=True)
+        self.created['ingredient'] += (
+            Ingredient.objects.count() - count_before)
+        existing = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.filter(
+                name__in={item['name'] for item in items}
+            ).values_list('pk', 'name', 'measurement_unit')
+        }
+        for item in items:
+            self.ingredients[item['id']] = existing[
+                item['name'], item['measurement_unit']]
+
+    def import_authors(self, items):
+        emails = {item['email'] for item in items}
+        known = set(User.objects.filter(
+            email__in=emails).values_list('email', flat=True))
+        users = []
+        for item in items:
+            if item['email'] in known:
+                continue
+            user = User(
+                username=item['username'], email=item['email'],
+                first_name=item['first_name'], last_name=item['last_name']
+            )
+            user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        existing = dict(User.objects.filter(
+            email__in=emails).values_list('email', 'pk'))
+        self.created['author'] += len(existing) - len(known)
+        for item in items:
+            if item['email'] in existing:
+                self.authors[item['id']] = existing[item['email']]
+
+    def import_recipes(self, items):
+        self.skipped += len(items)
+        items = [item for item in items if item['author_id'] in self.authors]
+        self.skipped -= len(items)
+        recipes = [
+            Recipe(
+                author_id=self.authors[item['author_id']],
+                name=item['name'],
+                text=item['text'],
+                cooking_time=item['cooking_time'],
+                image=item['image'],
+                thumbnail=item['thumbnail'],
+                image_webp=item['image_webp'],
+            )
+            for item in items
+        ]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(recipes)
+        else:
+            for recipe in recipes:
+                recipe.save()
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=self.tags[tag])
+            for recipe, item in zip(recipes, items)
+            for tag in item['tags']
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe.pk,
+                ingredient_id=self.ingredients[ingredient],
+                amount=amount
+            )
+            for recipe, item in zip(recipes, items)
+            for ingredient, amount in item['ingredients']
+        ])
+        refresh_search(
+            Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]))
+        self.created['recipe'] += len(recipes)
+
+    def flush(self, kind, items):
+        if not items:
+            return
+        with transaction.atomic():
+            getattr(self, f'import_{kind}s')(items)
+
+    def read(self, path):
+        if path == '-':
+            yield from sys.stdin
+            return
+        if not Path(path).is_file():
+            raise CommandError(f'File not found: {path}')
+        with open(path, encoding='utf-8') as source:
+            yield from source
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.tags, self.ingredients, self.authors = {}, {}, {}
+        self.created = dict.fromkeys(
+            ('tag', 'ingredient', 'author', 'recipe'), 0)
+        self.skipped = 0
+        kind, batch = None, []
+        for number, line in enumerate(self.read(options['path']), start=1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            item_kind = item.pop('type', None)
+            if item_kind not in self.created:
+                raise CommandError(f'Line {number}: unknown type {item_kind}')
+            if item_kind != kind or len(batch) >= options['batch_size']:
+                self.flush(kind, batch)
+                kind, batch = item_kind, []
+            batch.append(item)
+        self.flush(kind, batch)
+        if self.created['tag']:
+            bump_version(Tag)
+        if self.created['ingredient']:
+            bump_version(Ingredient)
+        self.stdout.write(
+            ', '.join(
+                f'{kind}s: {count}' for kind, count in self.created.items())
+            + f' created, recipes skipped: {self.skipped}, '
+            f'elapsed: {time.perf_counter() - started:.3f}s'
+        )
@@ -0,0 +1,82 @@
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand
+
+from foodgram.management.commands.benchmark import percentile
+
+CHUNK_SIZE = 1024
+
+
+class Command(BaseCommand):
+    help = "Load a running server with concurrent, optionally slow clients"
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='Full URL of the endpoint.')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--token', help='Auth token of the client.')
+        parser.add_argument(
+            '--read-delay', type=float, default=0,
+            help='Seconds to wait between 1 KB reads, emulating a slow '
+                 'client.'
+        )
+        parser.add_argument('--output', help='Save results as JSON.')
+        parser.add_argument('--label', default='')
+
+    def fetch(self, url, token, read_delay):
+        request = Request(url)
+        if token:
+            request.add_header('Authorization', f'Token {token}')
+        started = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                status = response.status
+                while response.read(CHUNK_SIZE):
+                    time.sleep(read_delay)
+        except HTTPError as error:
+            status = error.code
+        except URLError:
+            status = None
+        return time.perf_counter() - started, status
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(
+                lambda _: self.fetch(
+                    options['url'], options['token'], options['read_delay']),
+                range(options['requests'])
+            ))
+        elapsed = time.perf_counter() - started
+        timings = [timing for timing, _ in results]
+        statuses = sorted({str(status) for _, status in results})
+        result = {
+            'url': options['url'],
+            'concurrency': options['concurrency'],
+            'read_delay': options['read_delay'],
+            'statuses': statuses,
+            'p50_ms': percentile(timings, 50) * 1000,
+            'p95_ms': percentile(timings, 95) * 1000,
+            'p99_ms': percentile(timings, 99) * 1000,
+            'mean_ms': statistics.mean(timings) * 1000,
+            'requests_per_second': len(results) / elapsed,
+        }
+        self.stdout.write(
+            f'p50 {result["p50_ms"]:.2f}ms p95 {result["p95_ms"]:.2f}ms '
+            f'p99 {result["p99_ms"]:.2f}ms '
+            f'rps {result["requests_per_second"]:.1f} {statuses}'
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump({
+                    'label': options['label'],
+                    'created': datetime.now(timezone.utc).isoformat(),
+                    'requests': options['requests'],
+                    'result': result,
+                }, output, ensure_ascii=False, indent=2)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodgram.similarity import (MAX_POSTINGS, SIMILAR_LIMIT,
+                                 rebuild_similarities)
+
+
+class Command(BaseCommand):
+    help = "Recompute similar recipes by ingredient overlap"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=SIMILAR_LIMIT)
+        parser.add_argument(
+            '--max-postings', type=int, default=MAX_POSTINGS,
+            help='Ingredients used in more recipes do not produce '
+                 'candidates.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        created = rebuild_similarities(
+            options['limit'], options['max_postings'], options['batch_size'])
+        self.stdout.write(
+            f'Stored {created} pairs, '
+            f'elapsed: {time.perf_counter() - started:.3f}s'
+        )
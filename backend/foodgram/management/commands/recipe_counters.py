@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+
+from foodgram.counters import COUNTER_FIELDS, actual_count
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Recalculate or verify recipe favorite and cart counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare stored counters with the actual rows.'
+        )
+
+    def handle(self, *args, **options):
+        annotations = {
+            f'actual_{field}': actual_count(cls)
+            for cls, field in COUNTER_FIELDS.items()
+        }
+        mismatch = Q()
+        for field in COUNTER_FIELDS.values():
+            mismatch |= ~Q(**{field: F(f'actual_{field}')})
+        stale = Recipe.objects.annotate(**annotations).filter(mismatch)
+        if options['check']:
+            count = stale.count()
+            if count:
+                raise CommandError(f'{count} recipes have stale counters')
+            self.stdout.write('Counters are consistent')
+            return
+        updated = Recipe.objects.filter(
+            pk__in=list(stale.values_list('pk', flat=True))
+        ).update(**{
+            field: actual_count(cls) for cls, field in COUNTER_FIELDS.items()
+        })
+        self.stdout.write(f'Updated counters of {updated} recipes')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.images import make_variants
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Generate thumbnail and WebP variants of recipe images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Regenerate variants that already exist.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(thumbnail='')
+        processed = 0
+        for recipe_id in recipes.values_list('pk', flat=True).iterator():
+            make_variants(recipe_id)
+            processed += 1
+        self.stdout.write(f'Processed {processed} images')
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodgram.models import Recipe
+from foodgram.search import refresh_search
+
+
+class Command(BaseCommand):
+    help = "Fill recipe search vectors in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Also refresh recipes that already have a search vector.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recipes = Recipe.objects.all()
+        if not options['all']:
+            recipes = recipes.filter(search_vector__isnull=True)
+        last_pk = 0
+        refreshed = 0
+        while True:
+            ids = list(recipes.filter(pk__gt=last_pk).order_by(
+                'pk').values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            refresh_search(Recipe.objects.filter(pk__in=ids))
+            refreshed += len(ids)
+            last_pk = ids[-1]
+        self.stdout.write(
+            f'Refreshed {refreshed} recipes, '
+            f'elapsed: {time.perf_counter() - started:.3f}s'
+        )
@@ -1,6 +1,24 @@
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
 from rest_framework import mixins, viewsets
 
 
 class ListRetrieveMixin(mixins.ListModelMixin,
                         mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     pass
+
+
+class SnapshotListMixin:
+    """list() из заранее отрендеренного снимка справочника с ETag."""
+
+    snapshot = None
+
+    def list(self, request, *args, **kwargs):
+        content, etag = self.snapshot.get()
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -1,11 +1,31 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
 
+from users.models import Follow
 
 User = get_user_model()
 
 
+class PostgresGinIndex(GinIndex):
+    """GIN-индекс, который на других базах не создаётся: там поиск
+    идёт по индексу в памяти.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().create_sql(model, schema_editor, using, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return ''
+        return super().remove_sql(model, schema_editor, **kwargs)
+
+
 class Tag(models.Model):
     BLUE = "#0000FF"
     RED = "#FF0000"
@@ -45,6 +65,7 @@ class Ingredient(models.Model):
     name = models.CharField(
         'Название',
         max_length=200,
+        db_index=True,
     )
     measurement_unit = models.CharField(
         'Единица измерения',
@@ -52,6 +73,12 @@ class Ingredient(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_name_measurement_unit'
+            )
+        ]
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -59,6 +86,43 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для чтения."""
+
+    def with_user_flags(self, user):
+        """Флаги избранного и списка покупок одним запросом."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                is_author_subscribed=Value(
+                    False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def for_read(self, user):
+        """Рецепты со всеми связями для GetRecipeSerializer."""
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('pk'))))
+        return self.with_user_flags(user).prefetch_related(
+            'tags',
+            Prefetch('author', queryset=authors),
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -75,6 +139,18 @@ class Recipe(models.Model):
         upload_to='foodgram/',
         blank=True,
     )
+    thumbnail = models.ImageField(
+        'Миниатюра',
+        upload_to='foodgram/thumbnails/',
+        blank=True,
+        editable=False,
+    )
+    image_webp = models.ImageField(
+        'Картинка WebP',
+        upload_to='foodgram/webp/',
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         'Описание',
     )
@@ -96,8 +172,45 @@ class Recipe(models.Model):
         ]
     )
 
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=['author', '-id'],
+                name='recipe_author_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_popular_idx'
+            ),
+            PostgresGinIndex(
+                fields=['search_vector'],
+                name='recipe_search_idx'
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -190,3 +303,74 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return (f'{self.user.username} добавил'
                 f'{self.recipe.name} в список покупок')
+
+
+class ShoppingCartIngredient(models.Model):
+    """Сумма ингредиента по всем рецептам из списка покупок."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Ингредиент'
+    )
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient_cart'
+            )
+        ]
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списках покупок'
+
+
+class RecipeSimilarity(models.Model):
+    """Заранее посчитанный похожий рецепт по пересечению ингредиентов."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similar'
+            )
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+
+class DataVersion(models.Model):
+    """Версия данных модели: новая строка при каждом изменении."""
+
+    name = models.CharField('Модель', max_length=100, unique=True)
+    version = models.CharField('Версия', max_length=32)
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
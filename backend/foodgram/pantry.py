@@ -0,0 +1,180 @@
+import logging
+import sys
+from array import array
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.db import connection
+
+from backend.db_router import read_from_primary
+
+from .models import Recipe, RecipeIngredient
+from .versions import get_version
+
+logger = logging.getLogger(__name__)
+
+MAX_MISSING = 5
+# Ингредиент хранится битовой картой, если встречается чаще, чем в
+# 1/DENSE_RATIO рецептов; реже — массивом позиций (4 байта на рецепт).
+DENSE_RATIO = 32
+
+
+def to_bitmap(positions, size):
+    """Битовая карта (int) из позиций: бит p — рецепт с позицией p."""
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def iter_positions(bitmap):
+    """Позиции установленных битов по убыванию, пустые слова пропускаются."""
+    words = array('Q', bitmap.to_bytes(
+        (bitmap.bit_length() + 63) // 64 * 8, sys.byteorder))
+    for index in range(len(words) - 1, -1, -1):
+        word = words[index]
+        while word:
+            bit = word.bit_length() - 1
+            yield index * 64 + bit
+            word ^= 1 << bit
+
+
+def add_to_counter(slices, bitmap):
+    """Прибавляет по единице к счётчикам рецептов из bitmap.
+
+    Счётчик хранится срезами: slices[i] — i-й бит счётчика всех рецептов.
+    """
+    carry = bitmap
+    for index, current in enumerate(slices):
+        if not carry:
+            return
+        slices[index] = current ^ carry
+        carry &= current
+    if carry:
+        slices.append(carry)
+
+
+def at_least(slices, value, everything):
+    """Рецепты, у которых счётчик не меньше value."""
+    if value <= 0:
+        return everything
+    if value >> len(slices):
+        return 0
+    greater, equal = 0, everything
+    for index in range(len(slices) - 1, -1, -1):
+        if value >> index & 1:
+            equal &= slices[index]
+        else:
+            greater |= equal & slices[index]
+            equal &= ~slices[index]
+    return greater | equal
+
+
+executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='pantry-index')
+
+
+class PantryIndex:
+    """Инвертированный индекс ингредиент -> битовая карта рецептов.
+
+    После смены версии рецептов индекс пересобирается в фоне, а запросы
+    до замены отвечают по старому: удалённые рецепты отсеивает выборка
+    из базы, новые появляются после пересборки.
+    """
+
+    def __init__(self):
+        self._data = None
+        self._rebuilding = False
+        self._lock = Lock()
+
+    @read_from_primary()
+    def _load(self, version):
+        recipe_ids = array('q')
+        postings = defaultdict(lambda: array('I'))
+        sizes = defaultdict(list)
+        size = 0
+        for recipe_id, ingredient_id in RecipeIngredient.objects.order_by(
+                'recipe_id').values_list('recipe', 'ingredient').iterator():
+            if not recipe_ids or recipe_ids[-1] != recipe_id:
+                if recipe_ids:
+                    sizes[size].append(len(recipe_ids) - 1)
+                recipe_ids.append(recipe_id)
+                size = 0
+            postings[ingredient_id].append(len(recipe_ids) - 1)
+            size += 1
+        if recipe_ids:
+            sizes[size].append(len(recipe_ids) - 1)
+        total = len(recipe_ids)
+        for ingredient_id, positions in postings.items():
+            if len(positions) * DENSE_RATIO > total:
+                postings[ingredient_id] = to_bitmap(positions, total)
+        sizes = {
+            count: to_bitmap(positions, total)
+            for count, positions in sizes.items()
+        }
+        return version, recipe_ids, dict(postings), sizes
+
+    def _rebuild(self, version):
+        try:
+            self._data = self._load(version)
+        except Exception:
+            logger.exception('Pantry index rebuild failed')
+        finally:
+            self._rebuilding = False
+            connection.close()
+
+    def _get_data(self):
+        version = get_version(Recipe)
+        data = self._data
+        if data is None:
+            with self._lock:
+                if self._data is None:
+                    self._data = self._load(version)
+                return self._data
+        if data[0] != version and not self._rebuilding:
+            with self._lock:
+                if not self._rebuilding:
+                    self._rebuilding = True
+                    executor.submit(self._rebuild, version)
+        return data
+
+    def search(self, ingredient_ids, max_missing=0):
+        """Пары (recipe_id, missing) рецептов, где не хватает не больше
+        max_missing ингредиентов; сначала самые полные, затем новые.
+        """
+        _, recipe_ids, postings, sizes = self._get_data()
+        total = len(recipe_ids)
+        everything = (1 << total) - 1
+        slices = []
+        for ingredient_id in set(ingredient_ids):
+            bitmap = postings.get(ingredient_id)
+            if bitmap is None:
+                continue
+            if not isinstance(bitmap, int):
+                bitmap = to_bitmap(bitmap, total)
+            add_to_counter(slices, bitmap)
+        thresholds = {}
+
+        def covered_at_least(value):
+            if value not in thresholds:
+                thresholds[value] = at_least(slices, value, everything)
+            return thresholds[value]
+
+        results = []
+        for missing in range(max_missing + 1):
+            matched = 0
+            for count, recipes in sizes.items():
+                covered = count - missing
+                if covered <= 0:
+                    continue
+                matched |= recipes & covered_at_least(covered) & ~(
+                    covered_at_least(covered + 1))
+            results.extend(
+                (recipe_ids[position], missing)
+                for position in iter_positions(matched)
+            )
+        return results
+
+
+pantry_index = PantryIndex()
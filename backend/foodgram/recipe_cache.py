@@ -0,0 +1,74 @@
+from collections import Counter
+
+from django.core.cache import caches
+from django.db.models import F, Prefetch, prefetch_related_objects
+
+from .counters import COUNTER_FIELDS
+from .models import RecipeIngredient
+from .serializers import GetRecipeSerializer
+
+RECIPE_CACHE = 'recipes'
+IMAGE_FIELDS = ('image', 'thumbnail', 'image_webp')
+
+stats = Counter(hits=0, misses=0)
+
+
+def document_key(recipe):
+    return f'recipe:{recipe.pk}:{recipe.version}'
+
+
+def invalidate_recipes(queryset):
+    """Новая версия рецептов: старые документы в кэше больше не читаются."""
+    queryset.update(version=F('version') + 1)
+
+
+def build_documents(recipes):
+    """Не зависящая от пользователя часть GetRecipeSerializer."""
+    prefetch_related_objects(
+        recipes,
+        'tags',
+        'author',
+        Prefetch(
+            'recipeingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ),
+    )
+    return {
+        document_key(recipe): GetRecipeSerializer(recipe).data
+        for recipe in recipes
+    }
+
+
+def personalize(document, recipe, request):
+    """Подставляет в документ флаги текущего пользователя."""
+    document = dict(document)
+    document['is_favorited'] = recipe.is_favorited
+    document['is_in_shopping_cart'] = recipe.is_in_shopping_cart
+    document['author'] = dict(
+        document['author'], is_subscribed=recipe.is_author_subscribed)
+    for field in COUNTER_FIELDS.values():
+        document[field] = getattr(recipe, field)
+    for field in IMAGE_FIELDS:
+        if document[field]:
+            document[field] = request.build_absolute_uri(document[field])
+    return document
+
+
+def get_recipe_documents(recipes, request):
+    """Данные GetRecipeSerializer для рецептов из with_user_flags()."""
+    cache = caches[RECIPE_CACHE]
+    documents = cache.get_many([document_key(recipe) for recipe in recipes])
+    missing = [
+        recipe for recipe in recipes
+        if document_key(recipe) not in documents
+    ]
+    stats['hits'] += len(recipes) - len(missing)
+    stats['misses'] += len(missing)
+    if missing:
+        built = build_documents(missing)
+        cache.set_many(built)
+        documents.update(built)
+    return [
+        personalize(documents[document_key(recipe)], recipe, request)
+        for recipe in recipes
+    ]
@@ -0,0 +1,42 @@
+import hashlib
+from threading import Lock
+
+from rest_framework.renderers import JSONRenderer
+
+from backend.db_router import read_from_primary
+
+from .models import Ingredient, Tag
+from .serializers import IngredientSerializer, TagSerializer
+from .versions import get_version
+
+
+class ReferenceSnapshot:
+    """Отрендеренный JSON справочника с ETag, пересобираемый по версии."""
+
+    def __init__(self, model, serializer_class):
+        self.model = model
+        self.serializer_class = serializer_class
+        self._snapshot = None
+        self._lock = Lock()
+
+    @read_from_primary()
+    def _render(self, version):
+        content = JSONRenderer().render(self.serializer_class(
+            self.model.objects.order_by('pk'), many=True).data)
+        etag = '"{}"'.format(hashlib.sha1(content).hexdigest())
+        return version, content, etag
+
+    def get(self):
+        """Пара (content, etag) для текущей версии справочника."""
+        version = get_version(self.model)
+        snapshot = self._snapshot
+        if snapshot is None or snapshot[0] != version:
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None or snapshot[0] != version:
+                    snapshot = self._snapshot = self._render(version)
+        return snapshot[1:]
+
+
+tag_snapshot = ReferenceSnapshot(Tag, TagSerializer)
+ingredient_snapshot = ReferenceSnapshot(Ingredient, IngredientSerializer)
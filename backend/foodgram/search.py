@@ -0,0 +1,126 @@
+import re
+from collections import defaultdict
+from threading import Lock
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from backend.db_router import read_from_primary
+
+from .models import Recipe, RecipeIngredient
+from .versions import bump_version, get_version
+
+SEARCH_CONFIG = 'russian'
+WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def use_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def refresh_search(recipes):
+    """Обновляет поисковые данные рецептов из queryset recipes."""
+    bump_version(Recipe)
+    if not use_postgres():
+        return
+    ingredient_names = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    recipes.update(search_vector=(
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(Subquery(ingredient_names), Value('')),
+            weight='B', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+class SearchIndex:
+    """Инвертированный индекс рецептов для баз без полнотекстового поиска."""
+
+    def __init__(self):
+        self._data = None
+        self._lock = Lock()
+
+    @read_from_primary()
+    def _load(self, version):
+        index = defaultdict(lambda: defaultdict(float))
+        for pk, name, text in Recipe.objects.values_list(
+                'pk', 'name', 'text').iterator():
+            for token in tokenize(name):
+                index[token][pk] += WEIGHTS['name']
+            for token in tokenize(text):
+                index[token][pk] += WEIGHTS['text']
+        for pk, name in RecipeIngredient.objects.values_list(
+                'recipe', 'ingredient__name').iterator():
+            for token in tokenize(name):
+                index[token][pk] += WEIGHTS['ingredients']
+        return version, index
+
+    def search(self, query):
+        """{recipe_id: rank} рецептов, содержащих все слова запроса."""
+        version = get_version(Recipe)
+        data = self._data
+        if data is None or data[0] != version:
+            with self._lock:
+                data = self._data
+                if data is None or data[0] != version:
+                    data = self._data = self._load(version)
+        index = data[1]
+        ranks = None
+        for token in set(tokenize(query)):
+            postings = index.get(token, {})
+            if ranks is None:
+                ranks = dict(postings)
+                continue
+            ranks = {
+                pk: rank + postings[pk]
+                for pk, rank in ranks.items() if pk in postings
+            }
+        return ranks or {}
+
+
+search_index = SearchIndex()
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, по убыванию релевантности.
+
+    Без PostgreSQL queryset не меняется: страницу выдачи собирает
+    rank_recipes.
+    """
+    if not use_postgres():
+        return queryset
+    search_query = SearchQuery(query, config=SEARCH_CONFIG)
+    return queryset.filter(search_vector=search_query).annotate(
+        rank=SearchRank(F('search_vector'), search_query)
+    ).order_by('-rank', '-id')
+
+
+def rank_recipes(queryset, query, chunk_size=500):
+    """pk рецептов из queryset по убыванию релевантности запроса.
+
+    Ранжирует индекс в памяти; база только отсеивает найденные pk по
+    остальным фильтрам, порциями по chunk_size параметров.
+    """
+    ranks = search_index.search(query)
+    ranked = sorted(ranks, key=lambda pk: (-ranks[pk], -pk))
+    if not queryset.query.where:
+        return ranked
+    matched = set()
+    for start in range(0, len(ranked), chunk_size):
+        matched.update(queryset.filter(
+            pk__in=ranked[start:start + chunk_size]
+        ).values_list('pk', flat=True))
+    return [pk for pk in ranked if pk in matched]
@@ -1,10 +1,16 @@
+from functools import partial
+
 from drf_extra_fields.fields import Base64ImageField
 from django.db import transaction
-from django.shortcuts import get_object_or_404
 from rest_framework import serializers
+from rest_framework.exceptions import NotFound
 
 from .models import (Favorite, Ingredient, Recipe, ShoppingCart,
                      Tag, RecipeIngredient)
+from .images import schedule_variants
+from .search import refresh_search
+from .similarity import schedule_similar
+from .shopping_list import change_cart_totals
 from users.serializers import CustomUserSerializer
 
 
@@ -58,27 +64,31 @@ class GetRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'thumbnail',
+                  'image_webp', 'text', 'cooking_time', 'favorites_count',
+                  'in_carts_count')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
-        if request.user.is_anonymous:
+        if request is None or request.user.is_anonymous:
             return False
         return Favorite.objects.filter(
             user=request.user, recipe=obj.id).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
-        if request.user.is_anonymous:
+        if request is None or request.user.is_anonymous:
             return False
         return ShoppingCart.objects.filter(
             user=request.user, recipe=obj.id).exists()
 
     def get_ingredients(self, obj):
-        recipe = obj
-        ingredients = RecipeIngredient.objects.filter(recipe=recipe)
-        serializer = GetIngredientRecipeSerializer(ingredients, many=True)
+        serializer = GetIngredientRecipeSerializer(
+            obj.recipeingredients.all(), many=True)
         return serializer.data
 
 
@@ -87,7 +97,8 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnail', 'image_webp',
+                  'cooking_time')
 
 
 class ShortIngredientSerializerForRecipe(serializers.ModelSerializer):
@@ -132,23 +143,16 @@ class PostRecipeSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Добавьте количество ингредиента'
                 )
-        ingredient_list = []
-        for item in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=item['id'])
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    'Ингредиенты должны быть уникальны'
-                )
-            ingredient_list.append(ingredient)
+        ingredient_ids = [item['id'] for item in ingredients]
+        unique_ids = set(ingredient_ids)
+        if len(unique_ids) != len(ingredient_ids):
+            raise serializers.ValidationError(
+                'Ингредиенты должны быть уникальны'
+            )
+        if len(Ingredient.objects.in_bulk(unique_ids)) != len(unique_ids):
+            raise NotFound('Ингредиент не найден.')
         return data
 
-    def get_ingredients(self, ingredients):
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            ingredient_instance = ingredient['id']
-
-            yield amount, get_object_or_404(Ingredient, pk=ingredient_instance)
-
     @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
@@ -156,30 +160,66 @@ class PostRecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=author, **validated_data)
         recipe.tags.set(tags)
-        recipe_ingredients = []
-        for amount, ingredient in self.get_ingredients(ingredients):
-            recipe_ingredients.append(RecipeIngredient(
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
                 recipe=recipe,
-                ingredient=ingredient,
-                amount=amount
-            ))
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
+            )
+            for ingredient in ingredients
+        )
+        refresh_search(Recipe.objects.filter(pk=recipe.pk))
+        transaction.on_commit(partial(schedule_variants, recipe.pk))
+        transaction.on_commit(partial(schedule_similar, recipe.pk))
         return recipe
 
+    def update_ingredients(self, instance, ingredients):
+        """Применяет к рецепту только разницу в ингредиентах."""
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        deltas = dict(amounts)
+        current = {}
+        to_update, to_delete = [], []
+        for row in instance.recipeingredients.all():
+            ingredient_id = row.ingredient_id
+            deltas[ingredient_id] = deltas.get(ingredient_id, 0) - row.amount
+            if ingredient_id not in amounts or ingredient_id in current:
+                to_delete.append(row.pk)
+                continue
+            current[ingredient_id] = row
+            if row.amount != amounts[ingredient_id]:
+                row.amount = amounts[ingredient_id]
+                to_update.append(row)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=instance, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        )
+        RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        return deltas
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-
-        for amount, ingredient in self.get_ingredients(validated_data.
-                                                       pop('ingredients')):
-            RecipeIngredient.objects.update_or_create(
-                recipe=instance,
-                ingredient=ingredient,
-                amount=amount
-            )
-        return super().update(instance, validated_data)
+        deltas = self.update_ingredients(
+            instance, validated_data.pop('ingredients'))
+        # Строки пользователей блокируются раньше строки рецепта, как в
+        # избранном и списке покупок: иначе возможен deadlock.
+        change_cart_totals(
+            instance.carts.values_list('user', flat=True), deltas)
+        instance.tags.set(validated_data.pop('tags'))
+        transaction.on_commit(partial(schedule_similar, instance.pk))
+        if 'image' in validated_data:
+            # Старые варианты не подходят к новой картинке; пустая
+            # миниатюра — признак для recipe_images, если очередь занята.
+            validated_data.update(thumbnail='', image_webp='')
+            transaction.on_commit(partial(schedule_variants, instance.pk))
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        # Счётчики, версия и пути вариантов картинки меняются в обход
+        # формы, поэтому сохраняются только пришедшие от клиента поля.
+        instance.save(update_fields=list(validated_data))
+        return instance
 
     class Meta:
         model = Recipe
@@ -0,0 +1,127 @@
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from .constants import SHOPPING_LIST_TITLE
+from .models import RecipeIngredient, ShoppingCartIngredient
+
+User = get_user_model()
+
+NAME = 'ingredient__name'
+UNIT = 'ingredient__measurement_unit'
+
+
+def get_shopping_list(user):
+    """Готовые суммы ингредиентов из списка покупок.
+
+    Строки читаются сразу: под ASGI потоковый ответ отдаётся из event
+    loop, где обращаться к базе нельзя.
+    """
+    return list(ShoppingCartIngredient.objects.filter(
+        user=user
+    ).values(NAME, UNIT, 'amount').order_by(NAME, UNIT))
+
+
+def get_recipe_amounts(recipe_ids, sign=1):
+    """Количество каждого ингредиента в рецептах: {ingredient_id: amount}."""
+    amounts = RecipeIngredient.objects.filter(
+        recipe__in=recipe_ids
+    ).values('ingredient').annotate(amount=Sum('amount')).order_by()
+    return {item['ingredient']: sign * item['amount'] for item in amounts}
+
+
+@transaction.atomic
+def change_cart_totals(user_ids, deltas):
+    """Прибавляет deltas {ingredient_id: amount} к суммам пользователей.
+
+    Строки пользователей блокируются по порядку pk: параллельные запросы
+    не вставят одну и ту же сумму дважды и не зайдут в deadlock.
+    """
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    user_ids = list(User.objects.select_for_update().filter(
+        pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+    if not user_ids:
+        return
+    totals = {
+        (total.user_id, total.ingredient_id): total
+        for total in ShoppingCartIngredient.objects.select_for_update(
+        ).filter(user__in=user_ids, ingredient__in=deltas)
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, delta in deltas.items():
+            total = totals.get((user_id, ingredient_id))
+            if total is None:
+                if delta > 0:
+                    to_create.append(ShoppingCartIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        amount=delta
+                    ))
+                continue
+            total.amount += delta
+            if total.amount > 0:
+                to_update.append(total)
+            else:
+                to_delete.append(total.pk)
+    ShoppingCartIngredient.objects.bulk_create(to_create)
+    ShoppingCartIngredient.objects.bulk_update(to_update, ['amount'])
+    ShoppingCartIngredient.objects.filter(pk__in=to_delete).delete()
+
+
+def calculate_cart_totals():
+    """Суммы по всем спискам покупок, посчитанные заново."""
+    totals = RecipeIngredient.objects.filter(
+        recipe__carts__isnull=False
+    ).values('recipe__carts__user', 'ingredient').annotate(
+        amount=Sum('amount')
+    ).order_by()
+    for item in totals.iterator():
+        yield (
+            item['recipe__carts__user'], item['ingredient'], item['amount']
+        )
+
+
+def render_txt(items):
+    yield f'{SHOPPING_LIST_TITLE}\n\n'
+    for item in items:
+        yield f'{item[NAME]}({item[UNIT]}) {item["amount"]}\n'
+
+
+class Echo:
+    """Псевдо-файл для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for item in items:
+        yield writer.writerow((item[NAME], item[UNIT], item['amount']))
+
+
+def render_json(items):
+    separator = ''
+    yield '['
+    for item in items:
+        yield separator + json.dumps({
+            'name': item[NAME],
+            'measurement_unit': item[UNIT],
+            'amount': item['amount'],
+        }, ensure_ascii=False)
+        separator = ', '
+    yield ']'
+
+
+FORMATS = {
+    'txt': (render_txt, 'text/plain'),
+    'csv': (render_csv, 'text/csv'),
+    'json': (render_json, 'application/json'),
+}
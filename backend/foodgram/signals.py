@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .models import Ingredient, Recipe, Tag
+from .recipe_cache import invalidate_recipes
+from .versions import bump_version
+from .search import refresh_search
+
+User = get_user_model()
+
+# Строки RecipeIngredient сигналов не ловят: с ними каскадное удаление
+# рецепта не было бы быстрым, а правка каждой строки давала бы UPDATE.
+# Рецепт обновляют сериализатор, админка и команды, меняющие состав.
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=Tag)
+def bump_reference_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_saved_recipe(instance, raw=False, **kwargs):
+    if raw:
+        return
+    invalidate_recipes(Recipe.objects.filter(pk=instance.pk))
+    instance.version += 1
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_relations(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_recipes(Recipe.objects.filter(pk=instance.pk))
+    elif pk_set:
+        invalidate_recipes(Recipe.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tag_recipes(instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def invalidate_ingredient_recipes(instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_recipes(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, raw=False, update_fields=None,
+                              **kwargs):
+    if raw or update_fields == frozenset(['last_login']):
+        return
+    invalidate_recipes(Recipe.objects.filter(author=instance))
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_saved_recipe_search(instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def refresh_deleted_recipe_search(sender, **kwargs):
+    bump_version(Recipe)
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_search(instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search(Recipe.objects.filter(ingredients=instance))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def remember_ingredient_recipes(instance, **kwargs):
+    instance.recipe_ids = list(Recipe.objects.filter(
+        ingredients=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Ingredient)
+def refresh_deleted_ingredient_search(instance, **kwargs):
+    refresh_search(Recipe.objects.filter(
+        pk__in=getattr(instance, 'recipe_ids', ())))
@@ -0,0 +1,149 @@
+import heapq
+import logging
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import RecipeIngredient, RecipeSimilarity
+
+logger = logging.getLogger(__name__)
+
+SIMILAR_LIMIT = 10
+MAX_POSTINGS = 5000
+
+executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='recipe-similar')
+
+
+def load_vectors(recipe_ids=None):
+    """Разреженные векторы рецептов: {recipe_id: frozenset(ingredient_id)}."""
+    rows = RecipeIngredient.objects.all()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe__in=recipe_ids)
+    vectors = defaultdict(set)
+    for recipe_id, ingredient_id in rows.values_list(
+            'recipe', 'ingredient').iterator():
+        vectors[recipe_id].add(ingredient_id)
+    return {
+        recipe_id: frozenset(ingredients)
+        for recipe_id, ingredients in vectors.items()
+    }
+
+
+def build_postings(vectors):
+    """Транспонированная матрица: {ingredient_id: [recipe_id, ...]}."""
+    postings = defaultdict(list)
+    for recipe_id, ingredients in vectors.items():
+        for ingredient_id in ingredients:
+            postings[ingredient_id].append(recipe_id)
+    return postings
+
+
+def nearest(recipe_id, vectors, postings, frequent, limit):
+    """limit пар (score, id) с наибольшим коэффициентом Жаккара.
+
+    Кандидаты берутся по спискам редких ингредиентов; частые (frequent)
+    в кандидаты не ведут, но учитываются в пересечении.
+    """
+    ingredients = vectors.get(recipe_id, frozenset())
+    common = Counter()
+    for ingredient_id in ingredients - frequent:
+        common.update(postings[ingredient_id])
+    common.pop(recipe_id, None)
+    shared_frequent = ingredients & frequent
+    scores = []
+    for other_id, count in common.items():
+        other = vectors[other_id]
+        count += len(shared_frequent & other)
+        scores.append(
+            (count / (len(ingredients) + len(other) - count), other_id))
+    return heapq.nlargest(limit, scores)
+
+
+def rebuild_similarities(limit=SIMILAR_LIMIT, max_postings=MAX_POSTINGS,
+                         batch_size=1000):
+    """Пересчитывает похожие рецепты для всего каталога."""
+    vectors = load_vectors()
+    postings = build_postings(vectors)
+    frequent = frozenset(
+        ingredient_id for ingredient_id, recipes in postings.items()
+        if len(recipes) > max_postings
+    )
+    created = 0
+    with transaction.atomic():
+        RecipeSimilarity.objects.all().delete()
+        batch = []
+        for recipe_id in vectors:
+            batch.extend(
+                RecipeSimilarity(
+                    recipe_id=recipe_id, similar_id=other_id, score=score)
+                for score, other_id in nearest(
+                    recipe_id, vectors, postings, frequent, limit)
+            )
+            if len(batch) >= batch_size:
+                RecipeSimilarity.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+        RecipeSimilarity.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def load_nearest(recipe_id, limit=SIMILAR_LIMIT, max_postings=MAX_POSTINGS):
+    """nearest() для одного рецепта по векторам только его кандидатов."""
+    ingredients = RecipeIngredient.objects.filter(
+        recipe=recipe_id).values('ingredient')
+    frequency = RecipeIngredient.objects.filter(
+        ingredient__in=ingredients
+    ).values('ingredient').annotate(total=Count('pk')).order_by()
+    frequent = frozenset(
+        item['ingredient'] for item in frequency
+        if item['total'] > max_postings
+    )
+    candidates = RecipeIngredient.objects.filter(
+        ingredient__in=ingredients
+    ).exclude(ingredient__in=frequent).values('recipe')
+    vectors = load_vectors(candidates)
+    return nearest(
+        recipe_id, vectors, build_postings(vectors), frequent, limit)
+
+
+@transaction.atomic
+def store_nearest(recipe_id, neighbours):
+    RecipeSimilarity.objects.filter(recipe=recipe_id).delete()
+    RecipeSimilarity.objects.bulk_create(
+        RecipeSimilarity(recipe_id=recipe_id, similar_id=other_id, score=score)
+        for score, other_id in neighbours
+    )
+
+
+def update_similar(recipe_id):
+    """Пересчитывает рецепт и тех, кто ссылается или может ссылаться на него.
+
+    Соседи, которые раньше не ссылались на рецепт и не попали в его
+    новый топ, обновятся при полном пересчёте rebuild_similar.
+    """
+    neighbours = load_nearest(recipe_id)
+    affected = set(RecipeSimilarity.objects.filter(
+        similar=recipe_id).values_list('recipe', flat=True))
+    affected.update(other_id for _, other_id in neighbours)
+    affected.discard(recipe_id)
+    store_nearest(recipe_id, neighbours)
+    for other_id in affected:
+        store_nearest(other_id, load_nearest(other_id))
+
+
+def run_in_worker(recipe_id):
+    try:
+        update_similar(recipe_id)
+    except Exception:
+        logger.exception('Similarity update failed for recipe %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_similar(recipe_id):
+    """Один поток: обновления не перезаписывают строки друг друга."""
+    executor.submit(run_in_worker, recipe_id)
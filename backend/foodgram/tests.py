@@ -0,0 +1,587 @@
+import random
+import re
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from backend.db_router import ReplicaMiddleware, ReplicaRouter
+
+from users.models import Follow
+
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     RecipeSimilarity, ShoppingCart, ShoppingCartIngredient,
+                     Tag)
+from .pantry import PantryIndex
+from .search import search_recipes
+from .shopping_list import calculate_cart_totals
+from .versions import bump_version, get_version
+
+User = get_user_model()
+
+
+class FoodgramTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Имя', last_name='Фамилия', password='password')
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.com',
+            first_name='Имя', last_name='Фамилия', password='password')
+        cls.tags = [
+            Tag.objects.create(name=slug, color=color, slug=slug)
+            for slug, color in (
+                ('breakfast', Tag.YELLOW), ('lunch', Tag.GREEN),
+                ('dinner', Tag.BLUE))
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        # Документы рецептов и версии данных живут в кэше процесса,
+        # а pk рецептов после отката транзакции теста повторяются.
+        for cache in caches.all():
+            cache.clear()
+
+    @classmethod
+    def create_recipe(cls, amounts, tags=(), author=None, name='Рецепт'):
+        recipe = Recipe.objects.create(
+            author=author or cls.author, name=name, text='Описание',
+            cooking_time=10)
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=cls.ingredients[index],
+                amount=amount)
+            for index, amount in amounts.items()
+        )
+        return recipe
+
+
+class CartTotalsTest(FoodgramTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_recipe({0: 100, 1: 50})
+        self.second = self.create_recipe({1: 25, 2: 10})
+        self.client.force_authenticate(self.user)
+
+    def assertTotalsConsistent(self):
+        self.assertEqual(
+            set(ShoppingCartIngredient.objects.values_list(
+                'user', 'ingredient', 'amount')),
+            set(calculate_cart_totals())
+        )
+
+    def test_add_and_remove(self):
+        for recipe in (self.first, self.second):
+            response = self.client.post(
+                f'/api/recipes/{recipe.pk}/shopping_cart/')
+            self.assertEqual(response.status_code, 201)
+            self.assertTotalsConsistent()
+        self.assertEqual(
+            ShoppingCartIngredient.objects.get(
+                user=self.user, ingredient=self.ingredients[1]).amount,
+            75
+        )
+        response = self.client.delete(
+            f'/api/recipes/{self.first.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertTotalsConsistent()
+        self.assertFalse(ShoppingCartIngredient.objects.filter(
+            ingredient=self.ingredients[0]).exists())
+
+    def test_batch(self):
+        ids = [self.first.pk, self.second.pk]
+        response = self.client.post(
+            '/api/recipes/shopping_cart/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTotalsConsistent()
+        response = self.client.delete(
+            '/api/recipes/shopping_cart/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ShoppingCartIngredient.objects.exists())
+
+    def test_edit_recipe(self):
+        self.client.post(f'/api/recipes/{self.first.pk}/shopping_cart/')
+        self.client.post(f'/api/recipes/{self.second.pk}/shopping_cart/')
+        self.client.force_authenticate(self.author)
+        self.client.post(f'/api/recipes/{self.first.pk}/shopping_cart/')
+        response = self.client.patch(
+            f'/api/recipes/{self.first.pk}/', {
+                'name': 'Новое название',
+                'text': 'Описание',
+                'cooking_time': 5,
+                'tags': [self.tags[0].pk],
+                'ingredients': [
+                    {'id': self.ingredients[1].pk, 'amount': 10},
+                    {'id': self.ingredients[3].pk, 'amount': 7},
+                ],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTotalsConsistent()
+
+    def test_edit_locks_users_before_recipe(self):
+        self.client.post(f'/api/recipes/{self.first.pk}/shopping_cart/')
+        self.client.force_authenticate(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(f'/api/recipes/{self.first.pk}/', {
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 5,
+                'tags': [self.tags[1].pk],
+                'ingredients': [{'id': self.ingredients[1].pk, 'amount': 1}],
+            }, format='json')
+        statements = [query['sql'] for query in queries]
+        lock = next(
+            number for number, sql in enumerate(statements)
+            if sql.startswith('SELECT "users_user"."id" FROM "users_user"'))
+        update = next(
+            number for number, sql in enumerate(statements)
+            if sql.startswith('UPDATE "foodgram_recipe"'))
+        self.assertLess(lock, update)
+
+    def test_delete_recipe(self):
+        self.client.post(f'/api/recipes/{self.first.pk}/shopping_cart/')
+        self.client.post(f'/api/recipes/{self.second.pk}/shopping_cart/')
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(f'/api/recipes/{self.first.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertTotalsConsistent()
+
+
+class BatchTest(FoodgramTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_recipe({0: 100, 1: 50})
+        self.second = self.create_recipe({1: 25})
+        self.client.force_authenticate(self.user)
+
+    def get_counters(self, field):
+        return list(Recipe.objects.filter(
+            pk__in=(self.first.pk, self.second.pk)
+        ).order_by('pk').values_list(field, flat=True))
+
+    def test_recipes(self):
+        unknown = self.second.pk + 100
+        for action, model, field in (
+                ('favorite', Favorite, 'favorites_count'),
+                ('shopping_cart', ShoppingCart, 'in_carts_count')):
+            with self.subTest(action):
+                url = f'/api/recipes/{action}/'
+                self.client.post(f'/api/recipes/{self.first.pk}/{action}/')
+                response = self.client.post(url, {
+                    'ids': [self.first.pk, self.second.pk, unknown]
+                }, format='json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data, {'ids': [self.second.pk]})
+                self.assertEqual(self.get_counters(field), [1, 1])
+                self.assertEqual(model.objects.count(), 2)
+                response = self.client.delete(url, {
+                    'ids': [self.first.pk, unknown]
+                }, format='json')
+                self.assertEqual(response.data, {'ids': [self.first.pk]})
+                self.assertEqual(self.get_counters(field), [0, 1])
+        self.assertEqual(
+            list(ShoppingCartIngredient.objects.values_list(
+                'user', 'ingredient', 'amount')),
+            [(self.user.pk, self.ingredients[1].pk, 25)]
+        )
+
+    def test_subscriptions(self):
+        url = '/api/users/subscribe/'
+        unknown = self.author.pk + self.user.pk
+        response = self.client.post(url, {
+            'ids': [self.author.pk, self.user.pk, unknown]
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'ids': [self.author.pk]})
+        response = self.client.post(url, {
+            'ids': [self.author.pk]}, format='json')
+        self.assertEqual(response.data, {'ids': []})
+        self.assertEqual(
+            list(Follow.objects.values_list('user', 'author')),
+            [(self.user.pk, self.author.pk)]
+        )
+        response = self.client.delete(url, {
+            'ids': [self.author.pk, self.user.pk, unknown]
+        }, format='json')
+        self.assertEqual(response.data, {'ids': [self.author.pk]})
+        self.assertFalse(Follow.objects.exists())
+
+    def test_repeated_subscribe(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        # Ошибка вставки не должна ломать транзакцию запроса.
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        response = self.client.post(f'/api/users/{self.user.pk}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+
+
+class CachedTokenTest(FoodgramTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_me(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/me/')
+        return response.status_code, [
+            query['sql'] for query in queries
+            if Token._meta.db_table in query['sql']
+        ]
+
+    def test_cache_hit_skips_token_query(self):
+        status, token_queries = self.get_me()
+        self.assertEqual(status, 200)
+        self.assertEqual(len(token_queries), 1)
+        self.assertEqual(self.get_me(), (200, []))
+
+    def test_logout(self):
+        self.get_me()
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.get_me()[0], 401)
+
+    def test_inactive_user(self):
+        self.get_me()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_me()[0], 401)
+
+
+class RecipeCacheTest(FoodgramTestCase):
+
+    def test_edit_ingredients_invalidates_document(self):
+        recipe = self.create_recipe({0: 100}, tags=[self.tags[0]])
+        url = f'/api/recipes/{recipe.pk}/'
+        self.client.get(url)
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(url, {
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[1].pk, 'amount': 5}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(None)
+        self.assertEqual(
+            [(item['name'], item['amount'])
+             for item in self.client.get(url).data['ingredients']],
+            [(self.ingredients[1].name, 5)]
+        )
+
+    def test_delete_recipe_deletes_ingredients_without_loading_them(self):
+        recipe = self.create_recipe({0: 100, 1: 50, 2: 10})
+        self.client.force_authenticate(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(any(
+            query['sql'].startswith(
+                'SELECT "foodgram_recipeingredient"."id"')
+            for query in queries
+        ))
+        self.assertFalse(
+            RecipeIngredient.objects.filter(recipe=recipe.pk).exists())
+
+
+class RecipeListQueriesTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = User.objects.create_user(
+            username='other', email='other@example.com',
+            first_name='Имя', last_name='Фамилия', password='password')
+        for number in range(60):
+            cls.create_recipe(
+                {number % 5: 10, (number + 1) % 5: 20},
+                tags=cls.tags[:1 + number % 3],
+                author=cls.other if number % 2 else cls.author,
+                name=f'Рецепт {number}'
+            )
+
+    def test_page_size_does_not_change_query_count(self):
+        for limit in (6, 50):
+            with self.subTest(limit=limit):
+                caches['recipes'].clear()
+                with self.assertNumQueries(5):
+                    response = self.client.get(
+                        f'/api/recipes/?limit={limit}')
+                self.assertEqual(len(response.data['results']), limit)
+
+
+class RecipeFilterTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = [
+            cls.create_recipe(
+                {number % 5: 10}, tags=cls.tags[:1 + number % 3],
+                author=cls.user if number % 2 else cls.author,
+                name=f'Рецепт {number}')
+            for number in range(12)
+        ]
+        for recipe in cls.recipes[:6]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+
+    def get_ids(self, query, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_author_tags_and_favorited(self):
+        self.client.force_authenticate(self.user)
+        ids = self.get_ids(
+            f'author={self.author.pk}&tags=lunch&tags=dinner'
+            '&is_favorited=1', 7)
+        self.assertEqual(ids, [
+            recipe.pk for recipe in reversed(self.recipes[:6])
+            if recipe.author == self.author
+            and {tag.slug for tag in recipe.tags.all()} & {'lunch', 'dinner'}
+        ])
+
+    def test_several_matching_tags_do_not_duplicate(self):
+        ids = self.get_ids('tags=breakfast&tags=lunch&tags=dinner&limit=50', 6)
+        self.assertEqual(
+            ids, [recipe.pk for recipe in reversed(self.recipes)])
+
+    def test_anonymous_favorited_is_empty(self):
+        self.assertEqual(self.get_ids('is_favorited=1', 0), [])
+
+
+class CursorPaginationTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = [
+            cls.create_recipe({0: 10}, name=f'Суп {number}')
+            for number in range(15)
+        ]
+
+    def test_pages_follow_id_without_offset(self):
+        url = '/api/recipes/?pagination=cursor&limit=4'
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any(
+                'OFFSET' in query['sql'] for query in queries))
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(
+            ids, [recipe.pk for recipe in reversed(self.recipes)])
+
+    def test_other_orderings_are_rejected(self):
+        for query in ({'ordering': 'popular'}, {'search': 'суп'}):
+            with self.subTest(query=query):
+                response = self.client.get(
+                    '/api/recipes/', {'pagination': 'cursor', **query})
+                self.assertEqual(response.status_code, 400)
+
+
+class SearchTest(FoodgramTestCase):
+
+    def test_ranked_page_with_filters(self):
+        in_name = self.create_recipe({0: 10}, name='Суп гороховый')
+        in_text = self.create_recipe({0: 10}, name='Обед')
+        in_text.text = 'Подаётся как суп'
+        in_text.save()
+        self.create_recipe({0: 10}, name='Суп', author=self.user)
+        self.create_recipe({0: 10}, name='Каша')
+        response = self.client.get('/api/recipes/', {
+            'search': 'суп', 'author': self.author.pk, 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [in_name.pk])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [in_text.pk])
+
+
+class PantryIndexTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ingredients += [
+            Ingredient.objects.create(
+                name=f'Редкий ингредиент {number}', measurement_unit='г')
+            for number in range(35)
+        ]
+        rng = random.Random(1)
+        cls.vectors = {}
+        for number in range(80):
+            indexes = rng.sample(
+                range(5), rng.randint(1, 4)) + rng.sample(
+                range(5, 40), rng.randint(0, 3))
+            recipe = cls.create_recipe(
+                dict.fromkeys(indexes, 10), name=f'Рецепт {number}')
+            cls.vectors[recipe.pk] = {
+                cls.ingredients[index].pk for index in indexes}
+
+    def test_matches_brute_force(self):
+        index = PantryIndex()
+        rng = random.Random(2)
+        ingredient_ids = [ingredient.pk for ingredient in self.ingredients]
+        for _ in range(50):
+            have = set(rng.sample(ingredient_ids, rng.randint(1, 12)))
+            max_missing = rng.randint(0, 3)
+            expected = sorted(
+                ((len(ingredients - have), recipe_id)
+                 for recipe_id, ingredients in self.vectors.items()
+                 if len(ingredients - have) <= max_missing
+                 and ingredients & have),
+                key=lambda item: (item[0], -item[1])
+            )
+            self.assertEqual(
+                index.search(have, max_missing),
+                [(recipe_id, missing) for missing, recipe_id in expected]
+            )
+
+
+class DataVersionTest(FoodgramTestCase):
+
+    def test_version_changes_only_on_write(self):
+        version = get_version(Recipe)
+        caches['default'].clear()
+        self.assertEqual(get_version(Recipe), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version(Recipe)
+        self.assertNotEqual(get_version(Recipe), version)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2', 'replica3'])
+class ReplicaRouterTest(SimpleTestCase):
+
+    def get_aliases(self, method):
+        aliases = []
+
+        def get_response(request):
+            aliases.extend(
+                ReplicaRouter().db_for_read(Recipe) for _ in range(20))
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/api/recipes/')
+        ReplicaMiddleware(get_response)(request)
+        return set(aliases)
+
+    def test_one_replica_per_request(self):
+        for _ in range(10):
+            aliases = self.get_aliases('get')
+            self.assertEqual(len(aliases), 1)
+            self.assertLessEqual(aliases, {'replica1', 'replica2', 'replica3'})
+
+    def test_unsafe_methods_read_from_primary(self):
+        self.assertEqual(self.get_aliases('post'), {'default'})
+        self.assertEqual(ReplicaRouter().db_for_read(Recipe), 'default')
+
+
+class MetricsAccessTest(FoodgramTestCase):
+
+    def test_anonymous_and_regular_users_are_forbidden(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    def test_staff(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.client.get(
+            '/api/metrics/', HTTP_AUTHORIZATION='Bearer wrong'
+        ).status_code, 403)
+        self.assertEqual(self.client.get(
+            '/api/metrics/', HTTP_AUTHORIZATION='Bearer secret'
+        ).status_code, 200)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Планы запросов PostgreSQL.')
+class QueryPlansTest(TestCase):
+    """Основные запросы эндпоинтов не читают большие таблицы целиком."""
+
+    SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+    MIN_ROWS = 1000
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'generate_data', users=300, recipes=3000, stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = Follow.objects.select_related('user').last().user
+
+    def get_queries(self):
+        recipes = Recipe.objects.with_user_flags(self.user)
+        recipe_id = Recipe.objects.values_list('pk', flat=True).first()
+        return {
+            'RecipeViewSet.list': recipes[:6],
+            'RecipeViewSet.list?author': recipes.filter(author=self.user)[:6],
+            'RecipeViewSet.list?search': search_recipes(recipes, 'суп')[:6],
+            'RecipeViewSet.retrieve': recipes.filter(pk=recipe_id),
+            'RecipeViewSet.similar': RecipeSimilarity.objects.filter(
+                recipe=recipe_id).values_list('similar', flat=True),
+            'IngredientViewSet.list?name': Ingredient.objects.filter(
+                name__startswith='мол'),
+            'CustomUserViewSet.subscriptions': User.objects.filter(
+                following__user=self.user
+            ).annotate(recipes_count=Count('recipes')).order_by('id')[:6],
+            'RecipeViewSet.download_shopping_cart': (
+                ShoppingCartIngredient.objects.filter(user=self.user).values(
+                    'ingredient__name', 'ingredient__measurement_unit',
+                    'amount'
+                ).order_by('ingredient__name')
+            ),
+            'GetRecipeSerializer.ingredients': RecipeIngredient.objects.filter(
+                recipe__in=list(
+                    Recipe.objects.values_list('pk', flat=True)[:6])
+            ).select_related('ingredient'),
+        }
+
+    def test_no_sequential_scans_of_large_tables(self):
+        large_tables = {
+            model._meta.db_table
+            for model in (Favorite, Follow, Ingredient, Recipe,
+                          RecipeIngredient, RecipeSimilarity, ShoppingCart,
+                          ShoppingCartIngredient, User)
+            if model.objects.count() >= self.MIN_ROWS
+        }
+        self.assertIn(RecipeIngredient._meta.db_table, large_tables)
+        for name, queryset in self.get_queries().items():
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertFalse(
+                    set(self.SEQ_SCAN.findall(plan)) & large_tables, plan)
@@ -0,0 +1,54 @@
+from functools import partial
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from backend.db_router import read_from_primary
+
+from .models import DataVersion
+
+
+def version_key(model):
+    return f'reference-version:{model._meta.label_lower}'
+
+
+@read_from_primary()
+def load_version(name):
+    version = DataVersion.objects.filter(
+        name=name).values_list('version', flat=True).first()
+    if version is None:
+        version = DataVersion.objects.get_or_create(
+            name=name, defaults={'version': uuid4().hex})[0].version
+    return version
+
+
+def get_version(model):
+    """Текущая версия данных модели.
+
+    Хранится в базе и меняется только при записи; кэш Django держит
+    копию, в LocMem — не дольше DATA_VERSION_TIMEOUT секунд.
+    """
+    key = version_key(model)
+    version = cache.get(key)
+    if version is None:
+        version = load_version(model._meta.label_lower)
+        cache.set(key, version, settings.DATA_VERSION_TIMEOUT)
+    return version
+
+
+def store_version(model):
+    name = model._meta.label_lower
+    version = uuid4().hex
+    if not DataVersion.objects.filter(name=name).update(version=version):
+        DataVersion.objects.bulk_create(
+            [DataVersion(name=name, version=version)], ignore_conflicts=True)
+    cache.delete(version_key(model))
+
+
+def bump_version(model):
+    """Меняет версию после коммита: иначе читатели успеют закэшировать
+    под новой версией ещё старые данные.
+    """
+    transaction.on_commit(partial(store_version, model))
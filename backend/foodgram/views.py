@@ -1,40 +1,65 @@
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, status, exceptions
 from rest_framework.decorators import action
-from rest_framework.permissions import (AllowAny, IsAuthenticated,
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from .constants import DELETE_VALIDATION_ERRORS, POST_VALIDATION_ERRORS
-from .models import (Tag, Ingredient, Recipe,
-                     ShoppingCart, Favorite, RecipeIngredient)
-from .mixins import ListRetrieveMixin
-from users.pagination import CustomPaginator
+from .constants import (DELETE_VALIDATION_ERRORS, POST_VALIDATION_ERRORS,
+                        SHOPPING_LIST_FILENAME, SHOPPING_LIST_FORMAT_PARAM)
+from .models import (Tag, Ingredient, Recipe, RecipeSimilarity,
+                     ShoppingCart, Favorite)
+from .counters import change_counter
+from .mixins import ListRetrieveMixin, SnapshotListMixin
+from users.pagination import CustomPaginator, PagePaginator
+from users.serializers import BatchSerializer
 from .permissions import IsAuthorOrReadOnly
 from .filters import IngredientFilter, RecipeFilter
+from .ingredient_index import ingredient_index
+from .pantry import MAX_MISSING, pantry_index
+from .recipe_cache import get_recipe_documents
+from .recipe_cache import stats as recipe_cache_stats
+from .reference import ingredient_snapshot, tag_snapshot
+from .search import rank_recipes, use_postgres
+from .shopping_list import FORMATS as SHOPPING_LIST_FORMATS
+from .shopping_list import (change_cart_totals, get_recipe_amounts,
+                            get_shopping_list)
 from . serializers import (GetRecipeSerializer, PostRecipeSerializer,
                            TagSerializer, IngredientSerializer,
                            ShortRecipeSerializer)
 
+User = get_user_model()
 
-class TagViewSet(ListRetrieveMixin):
+
+class TagViewSet(SnapshotListMixin, ListRetrieveMixin):
     """Теги."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
+    snapshot = tag_snapshot
 
 
-class IngredientViewSet(ListRetrieveMixin):
+class IngredientViewSet(SnapshotListMixin, ListRetrieveMixin):
     """Ингредиенты"""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [AllowAny]
     filterset_class = IngredientFilter
+    snapshot = ingredient_snapshot
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        return HttpResponse(
+            ingredient_index.search(name), content_type='application/json')
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -46,6 +71,27 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.action in ['list', 'retrieve']:
+            return Recipe.objects.with_user_flags(self.request.user)
+        return Recipe.objects.all()
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        query = request.query_params.get('search')
+        if query and not use_postgres():
+            page = self.paginate_queryset(rank_recipes(queryset, query))
+            recipes = queryset.in_bulk(page)
+            page = [recipes[pk] for pk in page if pk in recipes]
+        else:
+            page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            get_recipe_documents(page, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        return Response(get_recipe_documents([recipe], request)[0])
+
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return GetRecipeSerializer
@@ -55,8 +101,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer. is_valid(raise_exception=True)
         self.perform_create(serializer)
+        recipe = Recipe.objects.for_read(request.user).get(
+            pk=serializer.instance.pk)
         serializer = GetRecipeSerializer(
-            instance=serializer.instance, context={'request': request})
+            instance=recipe, context={'request': request})
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers)
@@ -67,30 +115,89 @@ class RecipeViewSet(viewsets.ModelViewSet):
             recipe, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        recipe = Recipe.objects.for_read(request.user).get(pk=recipe.pk)
         serializer = GetRecipeSerializer(
-            instance=serializer.instance, context={'request': request})
+            instance=recipe, context={'request': request})
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_200_OK, headers=headers)
 
-    def create_or_delete_recipe(self, user, recipe_pk, request, cls):
-        recipe = get_object_or_404(Recipe, pk=recipe_pk)
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        change_cart_totals(
+            instance.carts.values_list('user', flat=True),
+            get_recipe_amounts([instance.pk], -1)
+        )
+        instance.delete()
 
+    def create_or_delete_recipe(self, user, recipe_pk, request, cls):
         if request.method == 'POST':
-            if cls.objects.filter(user=user, recipe=recipe).exists():
+            recipe = get_object_or_404(Recipe, pk=recipe_pk)
+            try:
+                with transaction.atomic():
+                    User.objects.select_for_update().get(pk=user.pk)
+                    cls.objects.create(user=user, recipe=recipe)
+                    change_counter(cls, [recipe.pk], 1)
+                    if cls is ShoppingCart:
+                        change_cart_totals(
+                            [user.id], get_recipe_amounts([recipe.pk]))
+            except IntegrityError:
                 raise exceptions.ValidationError(
                     POST_VALIDATION_ERRORS[cls.__name__])
-            cls.objects.create(user=user, recipe=recipe)
             serializer = ShortRecipeSerializer(instance=recipe, context={
                 'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            if not cls.objects.filter(user=user, recipe=recipe).exists():
+            with transaction.atomic():
+                User.objects.select_for_update().get(pk=user.pk)
+                deleted, _ = cls.objects.filter(
+                    user=user, recipe=recipe_pk).delete()
+                if deleted:
+                    change_counter(cls, [recipe_pk], -1)
+                    if cls is ShoppingCart:
+                        change_cart_totals(
+                            [user.id], get_recipe_amounts([recipe_pk], -1))
+            if not deleted:
+                get_object_or_404(Recipe, pk=recipe_pk)
                 raise exceptions.ValidationError(
                     DELETE_VALIDATION_ERRORS[cls.__name__])
-            cls.objects.filter(user=user, recipe=recipe).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def change_recipes_batch(self, request, cls):
+        """Пакетно добавляет рецепты в cls или убирает их оттуда.
+
+        Как и одиночные запросы, блокирует строку пользователя: present
+        не устареет до вставки или удаления.
+        """
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = set(serializer.validated_data['ids'])
+        user = request.user
+        with transaction.atomic():
+            User.objects.select_for_update().get(pk=user.pk)
+            present = set(cls.objects.filter(
+                user=user, recipe__in=recipe_ids
+            ).values_list('recipe', flat=True))
+            if request.method == 'POST':
+                changed = set(Recipe.objects.filter(
+                    pk__in=recipe_ids - present
+                ).values_list('pk', flat=True))
+                cls.objects.bulk_create(
+                    [cls(user=user, recipe_id=pk) for pk in changed],
+                    ignore_conflicts=True
+                )
+                sign = 1
+            else:
+                changed = present
+                cls.objects.filter(user=user, recipe__in=changed).delete()
+                sign = -1
+            if changed:
+                change_counter(cls, changed, sign)
+                if cls is ShoppingCart:
+                    change_cart_totals(
+                        [user.id], get_recipe_amounts(changed, sign))
+        return Response({'ids': sorted(changed)})
+
     @action(detail=True, methods=('POST', 'DELETE'), permission_classes=[
         IsAuthenticated])
     def favorite(self, request, pk=None):
@@ -103,25 +210,74 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = self.request.user
         return self.create_or_delete_recipe(user, pk, request, ShoppingCart)
 
+    @action(detail=False, methods=('POST', 'DELETE'), url_path='favorite',
+            url_name='favorite-batch', permission_classes=[IsAuthenticated])
+    def favorite_batch(self, request):
+        return self.change_recipes_batch(request, Favorite)
+
+    @action(detail=False, methods=('POST', 'DELETE'),
+            url_path='shopping_cart', url_name='shopping-cart-batch',
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_batch(self, request):
+        return self.change_recipes_batch(request, ShoppingCart)
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk=None):
+        similar_ids = list(RecipeSimilarity.objects.filter(
+            recipe=pk).values_list('similar', flat=True))
+        if not similar_ids:
+            get_object_or_404(Recipe, pk=pk)
+        recipes = Recipe.objects.with_user_flags(request.user).in_bulk(
+            similar_ids)
+        return Response(get_recipe_documents(
+            [recipes[recipe_id] for recipe_id in similar_ids
+             if recipe_id in recipes], request))
+
+    @action(detail=False, methods=['GET'], pagination_class=PagePaginator)
+    def pantry(self, request):
+        try:
+            ingredient_ids = [
+                int(value)
+                for value in request.query_params.getlist('ingredients')
+            ]
+            max_missing = int(request.query_params.get('missing', 0))
+        except ValueError:
+            raise exceptions.ValidationError(
+                'ingredients и missing должны быть целыми числами.')
+        if not ingredient_ids:
+            raise exceptions.ValidationError('Укажите ингредиенты.')
+        if not 0 <= max_missing <= MAX_MISSING:
+            raise exceptions.ValidationError(
+                f'missing должен быть от 0 до {MAX_MISSING}.')
+        page = self.paginate_queryset(
+            pantry_index.search(ingredient_ids, max_missing))
+        missing = dict(page)
+        recipes = Recipe.objects.with_user_flags(request.user).in_bulk(
+            missing)
+        documents = get_recipe_documents(
+            [recipes[recipe_id] for recipe_id in missing
+             if recipe_id in recipes], request)
+        for document in documents:
+            document['missing_count'] = missing[document['id']]
+        return self.get_paginated_response(documents)
+
+    @action(detail=False, methods=['GET'], permission_classes=[
+        IsAdminUser])
+    def cache_stats(self, request):
+        return Response(recipe_cache_stats)
+
     @action(detail=False, methods=['GET'], permission_classes=[
         IsAuthenticated])
     def download_shopping_cart(self, request):
-        shopping_cart = ShoppingCart.objects.filter(user=request.user)
-        recipes_id = [i.recipe.id for i in shopping_cart]
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in=recipes_id).values(
-            'ingredient__name', 'ingredient__measurement_unit').annotate(
-            amount=Sum('amount'))
-        final_list = 'Список покупок от Foodgram\n\n'
-        for item in ingredients:
-            amount = item.get('amount')
-            final_list += (
-                f'{item["ingredient__name"]}'
-                f'({item["ingredient__measurement_unit"]}) {amount}\n'
-            )
-
-        filename = 'foodgram_shopping_list.txt'
-        response = HttpResponse(final_list[:-1], content_type='text/plain')
+        file_format = request.query_params.get(
+            SHOPPING_LIST_FORMAT_PARAM, 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            raise exceptions.ValidationError(
+                f'Доступные форматы: {", ".join(SHOPPING_LIST_FORMATS)}.')
+        render, content_type = SHOPPING_LIST_FORMATS[file_format]
+        response = StreamingHttpResponse(
+            render(get_shopping_list(request.user)),
+            content_type=f'{content_type}; charset=utf-8')
         response['Content-Disposition'] = 'attachment; filename={0}'.format(
-            filename)
+            f'{SHOPPING_LIST_FILENAME}.{file_format}')
         return response
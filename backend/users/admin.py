@@ -1,18 +1,41 @@
 from django.contrib import admin
 from django.contrib.admin import register
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from . import models
+from .pagination import EstimatedCountPaginator
+from foodgram.models import Recipe
 
 
 @admin.register(models.Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @register(models.User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'email', 'username', 'first_name', 'last_name')
+    list_display = ('pk', 'email', 'username', 'first_name', 'last_name',
+                    'recipes_count')
     search_fields = ('username', 'email', 'first_name', 'last_name')
-    list_filter = ('username', 'email')
+    list_filter = ('is_staff', 'is_active')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        recipes_count = Recipe.objects.filter(
+            author=OuterRef('pk')
+        ).order_by().values('author').annotate(
+            total=Count('pk')
+        ).values('total')
+        return super().get_queryset(request).annotate(
+            recipes_count=Coalesce(Subquery(recipes_count), 0))
+
+    @admin.display(description='Рецептов', ordering='recipes_count')
+    def recipes_count(self, obj):
+        return obj.recipes_count
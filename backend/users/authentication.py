@@ -0,0 +1,77 @@
+import copy
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def cache_key(key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'auth-token:{digest}'
+
+
+class TokenCache:
+    """Пользователи по токенам: LRU процесса поверх кэша Django.
+
+    Отозванный токен удаляется из кэша Django и LRU текущего процесса
+    сразу, а в LRU других процессов живёт до AUTH_TOKEN_LOCAL_TTL
+    секунд. Если кэш Django не общий (LocMem), его записи тоже живут
+    не дольше AUTH_TOKEN_LOCAL_TTL.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self._users = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._users.get(key)
+            if entry is not None and entry[0] > monotonic():
+                self._users.move_to_end(key)
+                return copy.copy(entry[1])
+        user = cache.get(cache_key(key))
+        if user is not None:
+            self._store(key, user)
+        return user
+
+    def set(self, key, user):
+        cache.set(
+            cache_key(key), user, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        self._store(key, user)
+
+    def _store(self, key, user):
+        with self._lock:
+            self._users[key] = (monotonic() + self.ttl, copy.copy(user))
+            self._users.move_to_end(key)
+            while len(self._users) > self.size:
+                self._users.popitem(last=False)
+
+    def delete(self, keys):
+        keys = list(keys)
+        cache.delete_many([cache_key(key) for key in keys])
+        with self._lock:
+            for key in keys:
+                self._users.pop(key, None)
+
+
+token_cache = TokenCache(
+    settings.AUTH_TOKEN_LOCAL_SIZE, settings.AUTH_TOKEN_LOCAL_TTL)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для известных токенов."""
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, Token(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
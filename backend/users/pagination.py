@@ -1,6 +1,83 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
+ESTIMATED_COUNT_THRESHOLD = 100000
+CURSOR_ORDERINGS = {('-pk',), ('pk',), ('-id',), ('id',)}
+
+
+class CursorPaginator(CursorPagination):
+    """Пагинация по ключу: без COUNT(*) и OFFSET на глубоких страницах."""
 
-class CustomPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+    def get_ordering(self, request, queryset, view):
+        """Только уникальный и неизменяемый ключ: по другим полям курсор
+        превращается в OFFSET и пропускает строки, поменявшие значение.
+        """
+        ordering = None
+        if isinstance(queryset, QuerySet):
+            ordering = tuple(
+                queryset.query.order_by or queryset.model._meta.ordering
+            ) or ('-pk',)
+        if ordering not in CURSOR_ORDERINGS:
+            raise ValidationError(
+                'Курсорная пагинация доступна только при сортировке по id.')
+        return ordering
+
+
+class PagePaginator(PageNumberPagination):
+    """Постраничная пагинация; подходит и для списков, не только queryset."""
+
+    page_size_query_param = 'limit'
+    page_size = 6
+
+
+class CustomPaginator(PagePaginator):
+    mode_query_param = 'pagination'
+    cursor_paginator = None
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or CursorPaginator.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request):
+            self.cursor_paginator = CursorPaginator()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator админки: без фильтров число строк берётся из статистики.
+
+    Для таблиц больше ESTIMATED_COUNT_THRESHOLD строк PostgreSQL отдаёт
+    pg_class.reltuples вместо COUNT(*) по всей таблице.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
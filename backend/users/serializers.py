@@ -11,6 +11,20 @@ from foodgram.models import Recipe
 
 User = get_user_model()
 
+RECIPES_LIMIT = 3
+BATCH_LIMIT = 100
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или лимит по умолчанию."""
+    if request is None:
+        return RECIPES_LIMIT
+    try:
+        limit = int(request.query_params.get('recipes_limit', RECIPES_LIMIT))
+    except ValueError:
+        return RECIPES_LIMIT
+    return max(limit, 0)
+
 
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
@@ -22,8 +36,10 @@ class CustomUserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        if request.user.is_anonymous:
+        if request is None or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(user=request.user, author=obj.id).exists()
 
 
@@ -84,6 +100,8 @@ class SpecialRecipeSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "image",
+            "thumbnail",
+            "image_webp",
             "cooking_time",
         )
 
@@ -100,7 +118,8 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnail', 'image_webp',
+                  'cooking_time')
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -111,18 +130,34 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return Recipe.objects.filter(author=obj).count()
 
     def get_is_subscribed(self, obj):
         return True
 
     def get_recipes(self, object):
-        queryset = object.recipes.all()[:3]
+        queryset = getattr(object, 'recipes_preview', None)
+        if queryset is None:
+            limit = get_recipes_limit(self.context.get('request'))
+            queryset = object.recipes.all()[:limit]
 
-        return ShortRecipeSerializer(queryset, many=True).data
+        return ShortRecipeSerializer(
+            queryset, many=True, context=self.context).data
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username', 'first_name',
                   'last_name', 'is_subscribed',
                   'recipes', "recipes", 'recipes_count')
+
+
+class BatchSerializer(serializers.Serializer):
+    """Список id для пакетного добавления или удаления."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BATCH_LIMIT,
+    )
@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(instance, **kwargs):
+    token_cache.delete([instance.key])
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(instance, raw=False, update_fields=None, **kwargs):
+    """Пароль, is_active и остальные поля берутся из базы заново."""
+    if raw or update_fields == frozenset(['last_login']):
+        return
+    token_cache.delete(
+        Token.objects.filter(user=instance).values_list('key', flat=True))
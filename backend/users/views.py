@@ -1,4 +1,7 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Prefetch, prefetch_related_objects
+from django.db.models.expressions import RawSQL
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status, exceptions
@@ -10,14 +13,33 @@ from rest_framework.response import Response
 
 from users.pagination import CustomPaginator
 from .serializers import (
-    CustomUserSerializer, SubscriptionSerializer
+    BatchSerializer, CustomUserSerializer, SubscriptionSerializer,
+    get_recipes_limit
 )
 from .models import Follow
+from foodgram.models import Recipe
 
 
 User = get_user_model()
 
 
+def get_latest_recipes(author_ids, limit):
+    """Последние limit рецептов каждого автора, отобранные ROW_NUMBER()."""
+    if not author_ids or not limit:
+        return Recipe.objects.none()
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    ranked = (
+        'SELECT id FROM ('
+        'SELECT id, ROW_NUMBER() OVER ('
+        'PARTITION BY author_id ORDER BY id DESC) AS position '
+        f'FROM {Recipe._meta.db_table} '
+        f'WHERE author_id IN ({placeholders})'
+        ') AS ranked WHERE position <= %s'
+    )
+    return Recipe.objects.filter(
+        pk__in=RawSQL(ranked, (*author_ids, limit)))
+
+
 class CustomUserViewSet(UserViewSet):
     """Юзеры."""
 
@@ -32,11 +54,17 @@ class CustomUserViewSet(UserViewSet):
         serializer_class=SubscriptionSerializer
     )
     def subscriptions(self, request):
-        user = request.user
-        favorites = user.followers.all()
-        users = User.objects.filter(id__in=[f.author.id for f in favorites])
-        paginated_queryset = self.paginate_queryset(users)
-        serializer = self.serializer_class(paginated_queryset, many=True)
+        authors = User.objects.filter(
+            following__user=request.user
+        ).annotate(recipes_count=Count('recipes')).order_by('id')
+        page = self.paginate_queryset(authors)
+        prefetch_related_objects(page, Prefetch(
+            'recipes',
+            queryset=get_latest_recipes(
+                [author.id for author in page], get_recipes_limit(request)),
+            to_attr='recipes_preview'
+        ))
+        serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
 
     @action(
@@ -46,21 +74,52 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscribe(self, request, id=None):
         user = request.user
-        author = get_object_or_404(User, pk=id)
         if request.method == 'POST':
+            author = get_object_or_404(User, pk=id)
             if user == author:
                 raise exceptions.ValidationError(
                     'Подписываться на себя запрещено.')
-            if Follow.objects.filter(user=user, author=author).exists():
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(user=user, author=author)
+            except IntegrityError:
                 raise exceptions.ValidationError(
                     'Вы уже подписаны на этого пользователя.')
-            Follow.objects.create(user=user, author=author)
             serializer = self.get_serializer(author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
-            if not Follow.objects.filter(user=user, author=author).exists():
+            deleted, _ = Follow.objects.filter(user=user, author=id).delete()
+            if not deleted:
+                get_object_or_404(User, pk=id)
                 raise exceptions.ValidationError(
                     'Вы не подписаны на этого пользователя.')
-            Follow.objects.filter(user=user, author=author).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='subscribe',
+        url_name='subscribe-batch',
+        permission_classes=[IsAuthenticated]
+    )
+    def subscribe_batch(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        author_ids = set(serializer.validated_data['ids']) - {request.user.id}
+        present = set(Follow.objects.filter(
+            user=request.user, author__in=author_ids
+        ).values_list('author', flat=True))
+        if request.method == 'POST':
+            changed = set(User.objects.filter(
+                pk__in=author_ids - present
+            ).values_list('pk', flat=True))
+            Follow.objects.bulk_create(
+                [Follow(user=request.user, author_id=pk) for pk in changed],
+                ignore_conflicts=True
+            )
+        else:
+            changed = present
+            Follow.objects.filter(
+                user=request.user, author__in=changed).delete()
+        return Response({'ids': sorted(changed)})